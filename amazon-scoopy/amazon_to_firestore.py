@@ -1,35 +1,61 @@
 import requests
-from bs4 import BeautifulSoup
 import time
 import random
 import re
+import functools
 from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
 import json
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+# The storage backends and query fields are shared with the scrapers at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from product_fields import bare_count, with_query_fields
+from product_store import open_store
+
 # Load environment variables
 load_dotenv()
 
-# Initialize Firebase Admin SDK
-cred_dict = {
-    "type": "service_account",
-    "project_id": os.getenv("FIREBASE_PROJECT_ID"),
-    "private_key": os.getenv("FIREBASE_PRIVATE_KEY").replace("\\n", "\n"),
-    "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
-    "token_uri": "https://oauth2.googleapis.com/token",
-    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-    "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{os.getenv('FIREBASE_CLIENT_EMAIL').replace('@', '%40')}"
-}
+def init_firestore_admin():
+    """Initialize Firebase Admin SDK from FIREBASE_* environment variables"""
+    required_vars = ['FIREBASE_PROJECT_ID', 'FIREBASE_CLIENT_EMAIL', 'FIREBASE_PRIVATE_KEY']
+    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    cred_dict = {
+        "type": "service_account",
+        "project_id": os.getenv("FIREBASE_PROJECT_ID"),
+        "private_key": os.getenv("FIREBASE_PRIVATE_KEY").replace("\\n", "\n"),
+        "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+        "client_x509_cert_url": f"https://www.googleapis.com/robot/v1/metadata/x509/{os.getenv('FIREBASE_CLIENT_EMAIL').replace('@', '%40')}"
+    }
+
+    cred = credentials.Certificate(cred_dict)
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+@functools.lru_cache(maxsize=None)
+def get_db():
+    """Return the product store, connecting on first use.
+
+    Firestore by default; set PRODUCT_STORE (e.g. sqlite:///products.db) to run locally.
+    """
+    return open_store(firestore_factory=init_firestore_admin)
 
-cred = credentials.Certificate(cred_dict)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def make_soup(markup):
+    """Parse HTML, importing BeautifulSoup only when a page is actually parsed"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, 'html.parser')
 
 def test_firestore_connection():
     try:
@@ -37,7 +63,7 @@ def test_firestore_connection():
             "message": "Hello from amazon-scoopy",
             "timestamp": datetime.utcnow().isoformat()
         }
-        db.collection("test_collection").document("hello_world").set(test_doc)
+        get_db().collection("test_collection").document("hello_world").set(test_doc)
         print("✅ Firestore test document written successfully.")
     except Exception as e:
         print("❌ Firestore test write failed:", str(e))
@@ -90,7 +116,7 @@ def scrape_amazon_best_sellers():
         response = session.get(url, headers=get_headers())
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = make_soup(response.text)
         
         # Find all product items and limit to 8
         products = soup.select('div[data-asin]')[:8]
@@ -114,7 +140,8 @@ def scrape_amazon_best_sellers():
                 
                 price = product.select_one('span._cDEzb_p13n-sc-price_3mJ9Z')
                 rating = product.select_one('span.a-icon-alt')
-                review_count = product.select_one('span.a-size-small')
+                review_count = product.select_one('a[href*="product-reviews"] span.a-size-small')
+                review_count = bare_count(review_count.text) if review_count else None
                 
                 print(f"\n🔍 Processing product {i}/{len(products)}")
                 print(f"ASIN: {asin}")
@@ -132,16 +159,19 @@ def scrape_amazon_best_sellers():
                     'title': title_div.text.strip(),
                     'price': price.text.strip() if price else 'N/A',
                     'rating': rating.text.split()[0] if rating else 'N/A',
-                    'review_count': review_count.text.strip() if review_count else '0',
                     'image': image_url,
                     'timestamp': datetime.now().isoformat(),
-                    'source': 'amazon_best_sellers'
+                    'source': 'amazon_best_sellers',
+                    'source_rank': i
                 }
+                if review_count is not None:
+                    # Left out rather than 0 when the card shows no count
+                    product_data['review_count'] = review_count
                 
                 print(f"📦 Ready to upload ASIN: {asin} - Title: {title_div.text.strip()}")
                 
                 try:
-                    db.collection("products").document(asin).set(product_data)
+                    get_db().collection("products").document(asin).set(with_query_fields(product_data))
                     print(f"✅ Uploaded: {title_div.text.strip()} | Image: {image_url}")
                 except Exception as e:
                     print(f"❌ Failed to upload {asin}: {str(e)}")
@@ -1,21 +1,82 @@
 import requests
-from bs4 import BeautifulSoup
+import os
 import time
 import random
 import re
+import functools
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
 import json
+from product_fields import bare_count, with_query_fields
+from product_store import open_store
+from selector_stats import SelectorStats, layout_fingerprint
+from hedged_fetch import CircuitOpen, DeadlineExceeded, HedgedFetcher
+from memory_profile import MemoryProfiler, bounded_memory
 
-# Initialize Firebase
-try:
-    cred = credentials.Certificate('serviceAccountKey.json')
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-except Exception as e:
-    print(f"Firebase initialization error: {str(e)}")
-    db = None
+# Heavy clients (product store, HTTP session) and the HTML parser are created
+# on first use so importing this module stays cheap; see startup_benchmark.py
+
+@functools.lru_cache(maxsize=None)
+def get_db():
+    """Return the product store (Firestore unless PRODUCT_STORE says otherwise)"""
+    try:
+        return open_store()
+    except Exception as e:
+        print(f"Product store initialization error: {str(e)}")
+        return None
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """Return a shared HTTP session so requests reuse pooled connections.
+
+    With FETCH_ARCHIVE_MODE set, the session records to or replays from a
+    fetch archive (see fetch_archive.py).
+    """
+    from fetch_archive import wrap_session
+    return wrap_session(requests.Session())
+
+def polite_delay(low, high):
+    """Random pause between requests, scaled by FETCH_REPLAY_SPEED when replaying an archive"""
+    from fetch_archive import archive_mode, replay_speed
+    scale = replay_speed() if archive_mode() == 'replay' else 1.0
+    if scale:
+        time.sleep(random.uniform(low, high) * scale)
+
+@functools.lru_cache(maxsize=None)
+def get_fetcher():
+    """Return the deadline-aware, hedging fetcher shared by every scrape function"""
+    return HedgedFetcher(get_session, get_headers)
+
+def fetch(url):
+    """GET a page with scraper headers; raises requests.RequestException on failure"""
+    return get_fetcher().fetch(url)
+
+def requests_made():
+    """Number of HTTP requests issued through fetch() in this process, hedges included"""
+    return get_fetcher().requests_sent
+
+@functools.lru_cache(maxsize=None)
+def get_selector_stats():
+    """Return the selector hit-rate tracker.
+
+    It starts in memory, so parsing pages never touches the product store;
+    the command-line entry points attach the store to load and save stats.
+    """
+    return SelectorStats()
+
+def make_soup(markup):
+    """Parse HTML, importing BeautifulSoup only when a page is actually parsed"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(markup, 'html.parser')
+
+def release_soup(soup):
+    """In bounded-memory mode, free a parse tree as soon as its page is extracted"""
+    if soup is not None and bounded_memory():
+        soup.decompose()
+
+@functools.lru_cache(maxsize=None)
+def get_memory_profiler():
+    """Return the run's memory profiler (inert unless MEMORY_PROFILE is set)"""
+    return MemoryProfiler()
 
 def get_headers():
     user_agents = [
@@ -32,21 +93,51 @@ def get_headers():
         'Pragma': 'no-cache',
     }
 
+# ASIN patterns for the various Amazon URL formats, tried in order
+ASIN_PATTERNS = [
+    re.compile(r'/([A-Z0-9]{10})(?:[/?]|$)'),  # Standard ASIN pattern
+    re.compile(r'dp/([A-Z0-9]{10})'),          # dp pattern
+    re.compile(r'product/([A-Z0-9]{10})'),     # product pattern
+    re.compile(r'deal/([A-Z0-9]{10})')         # deal pattern
+]
+
+# Opening tags carrying a data-asin in raw listing HTML; only those of a product grid card count
+DATA_ASIN_TAG_RE = re.compile(rb'<div\b[^>]*?\bdata-asin=["\']([A-Z0-9]{10})["\'][^>]*>')
+# Class/attribute markers of the ranking and search result grid cards (not carousels,
+# recently-viewed strips or ads, which carry data-asin too)
+GRID_CARD_MARKERS = (b'p13n-sc-uncoverable-faceout', b'zg-grid-general-faceout',
+                     b'data-component-type="s-search-result"')
+
 def extract_asin(url):
     # Extract ASIN from various Amazon URL formats
-    asin_patterns = [
-        r'/([A-Z0-9]{10})(?:[/?]|$)',  # Standard ASIN pattern
-        r'dp/([A-Z0-9]{10})',          # dp pattern
-        r'product/([A-Z0-9]{10})',     # product pattern
-        r'deal/([A-Z0-9]{10})'         # deal pattern
-    ]
-    
-    for pattern in asin_patterns:
-        match = re.search(pattern, url)
+    for pattern in ASIN_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return None
 
+def discover_asins(content, limit=None):
+    """ASINs of the grid cards on a listing page, in page order, found in the raw HTML bytes.
+
+    Only data-asin tags of the ranking/search grid cards count, so no parse tree
+    is built. Returns an empty list on pages without that markup; callers then
+    fall back to parsing the page.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    asins = []
+    seen = set()
+    for match in DATA_ASIN_TAG_RE.finditer(content):
+        if not any(marker in match.group(0) for marker in GRID_CARD_MARKERS):
+            continue
+        asin = match.group(1).decode('ascii')
+        if asin not in seen:
+            seen.add(asin)
+            asins.append(asin)
+            if limit is not None and len(asins) >= limit:
+                break
+    return asins
+
 def create_affiliate_link(url):
     asin = extract_asin(url)
     if asin:
@@ -93,72 +184,163 @@ def safe_convert_rating(rating_text):
         pass
     return None
 
-def extract_product_info(soup, asin):
+def extract_product_info(soup, asin, layout='detail:unknown'):
+    """Extract product fields from a detail page.
+
+    layout is the page's layout fingerprint (see selector_stats.layout_fingerprint);
+    selectors are tried in list order, with any that keep missing on that layout tried last.
+    """
     try:
+        stats = get_selector_stats()
+
         # Multiple selectors for different page layouts
         title_selectors = ['span#productTitle', 'h1.product-title-word-break', 'h1.a-size-large']
         price_selectors = ['span.a-price-whole', 'span.a-offscreen', 'span.a-color-price']
         rating_selectors = ['span.a-icon-alt', 'i.a-icon-star span.a-icon-alt']
         review_selectors = ['span#acrCustomerReviewText', 'span.a-size-base.a-color-secondary']
+        list_price_selectors = ['span.basisPrice span.a-offscreen', 'span.a-price.a-text-price span.a-offscreen']
         image_selectors = ['img#landingImage', 'img#imgBlkFront', 'img.a-dynamic-image']
 
-        # Try different selectors for each field
+        # Try different selectors for each field, most precise first
+        title = None
+        title_elem = stats.select_one(soup, layout, 'title', title_selectors)
+        if title_elem:
+            title = safe_extract_text(title_elem)
+
+        price = None
+        price_elem = stats.select_one(soup, layout, 'price', price_selectors)
+        if price_elem:
+            price = safe_convert_price(safe_extract_text(price_elem))
+
+        # Struck-through "List Price" / "Typical price", only shown on discounted products
+        list_price = None
+        list_price_elem = stats.select_one(soup, layout, 'list_price', list_price_selectors)
+        if list_price_elem:
+            list_price = safe_convert_price(safe_extract_text(list_price_elem))
+
+        rating = None
+        rating_elem = stats.select_one(soup, layout, 'rating', rating_selectors)
+        if rating_elem:
+            rating = safe_convert_rating(safe_extract_text(rating_elem))
+
+        reviews = None
+        reviews_elem = stats.select_one(soup, layout, 'review_count', review_selectors,
+                                        accept=lambda elem: re.sub(r'[^\d]', '', safe_extract_text(elem)))
+        if reviews_elem:
+            reviews = int(re.sub(r'[^\d]', '', safe_extract_text(reviews_elem)))
+
+        image = None
+        image_elem = stats.select_one(soup, layout, 'image', image_selectors,
+                                      accept=lambda elem: 'src' in elem.attrs)
+        if image_elem:
+            image = image_elem['src']
+
+        product = {
+            'asin': asin,
+            'title': title,
+            'price': price,
+            'list_price': list_price,
+            'rating': rating,
+            'image': image,
+            'timestamp': datetime.utcnow(),
+            'last_updated': datetime.utcnow()
+        }
+        if reviews is not None:
+            # Left out when not found, so a merge keeps the stored count instead of writing 0
+            product['review_count'] = reviews
+        return product
+    except Exception as e:
+        print(f"Error extracting product info for ASIN {asin}: {str(e)}")
+        return None
+
+# Fields a listing card must provide for the product to skip the detail-page fetch
+REQUIRED_LISTING_FIELDS = ('title', 'price', 'image')
+
+def extract_listing_product(card):
+    """Build a product from a `div[data-asin]` card on a listing page"""
+    asin = card.get('data-asin')
+    if not asin:
+        return None
+    try:
+        # Listing cards vary between best sellers, new releases and search grids
+        title_selectors = ['div._cDEzb_p13n-sc-css-line-clamp-3_g3dy1', 'div._cDEzb_p13n-sc-css-line-clamp-1_1Fn1y',
+                           'div.p13n-sc-truncate', 'h2 span', 'span.a-size-base-plus']
+        price_selectors = ['span._cDEzb_p13n-sc-price_3mJ9Z', 'span.p13n-sc-price', 'span.a-price span.a-offscreen',
+                           'span.a-color-price']
+        review_selectors = ['a[href*="product-reviews"] span.a-size-small', 'span.a-size-base.s-underline-text']
+
         title = None
         for selector in title_selectors:
-            title_elem = soup.select_one(selector)
-            if title_elem:
+            title_elem = card.select_one(selector)
+            if title_elem and safe_extract_text(title_elem):
                 title = safe_extract_text(title_elem)
                 break
 
+        image = None
+        image_elem = card.select_one('img')
+        if image_elem:
+            image = image_elem.get('src')
+            # Best-seller cards carry the product title as the image alt text
+            if not title and image_elem.get('alt'):
+                title = image_elem['alt'].strip()
+
         price = None
         for selector in price_selectors:
-            price_elem = soup.select_one(selector)
+            price_elem = card.select_one(selector)
             if price_elem:
                 price = safe_convert_price(safe_extract_text(price_elem))
-                break
+                if price:
+                    break
 
-        rating = None
-        for selector in rating_selectors:
-            rating_elem = soup.select_one(selector)
-            if rating_elem:
-                rating = safe_convert_rating(safe_extract_text(rating_elem))
-                break
+        list_price = safe_convert_price(
+            safe_extract_text(card.select_one('span.a-price.a-text-price span.a-offscreen')))
+        rating = safe_convert_rating(safe_extract_text(card.select_one('span.a-icon-alt')))
 
-        reviews = 0
+        reviews = None
         for selector in review_selectors:
-            reviews_elem = soup.select_one(selector)
-            if reviews_elem:
-                reviews_text = safe_extract_text(reviews_elem)
-                try:
-                    reviews = int(re.sub(r'[^\d]', '', reviews_text))
-                    break
-                except ValueError:
-                    continue
-
-        image = None
-        for selector in image_selectors:
-            image_elem = soup.select_one(selector)
-            if image_elem and 'src' in image_elem.attrs:
-                image = image_elem['src']
+            reviews_elem = card.select_one(selector)
+            count = bare_count(safe_extract_text(reviews_elem)) if reviews_elem else None
+            if count is not None:
+                reviews = count
                 break
 
-        return {
+        product = {
             'asin': asin,
             'title': title,
             'price': price,
+            'list_price': list_price,
             'rating': rating,
-            'review_count': reviews,
             'image': image,
             'timestamp': datetime.utcnow(),
             'last_updated': datetime.utcnow()
         }
+        if reviews is not None:
+            product['review_count'] = reviews
+        return product
     except Exception as e:
-        print(f"Error extracting product info for ASIN {asin}: {str(e)}")
+        print(f"Error extracting listing card for ASIN {asin}: {str(e)}")
         return None
 
+def is_complete_product(product_data):
+    """True if the product has every field needed to publish it without a detail fetch"""
+    return all(product_data.get(field) for field in REQUIRED_LISTING_FIELDS)
+
+def merge_product_info(listing_data, detail_data):
+    """Fill fields missing from a listing card with values from the detail page"""
+    if not listing_data:
+        return detail_data
+    if not detail_data:
+        return listing_data
+    merged = dict(listing_data)
+    for key, value in detail_data.items():
+        if value and not merged.get(key):
+            merged[key] = value
+    return merged
+
 def save_to_firestore(product_data):
+    db = get_db()
     if not db:
-        print("Firebase not initialized. Skipping database save.")
+        print("Product store not initialized. Skipping database save.")
         return False
     
     try:
@@ -168,14 +350,95 @@ def save_to_firestore(product_data):
             
         # Use ASIN as document ID
         doc_ref = db.collection('products').document(product_data['asin'])
-        doc_ref.set(product_data, merge=True)
+        doc_ref.set(with_query_fields(product_data), merge=True)
         return True
     except Exception as e:
         print(f"Error saving to Firestore: {str(e)}")
         return False
 
-def scrape_deals_page():
-    """Specialized function for scraping the deals page"""
+def save_many_to_firestore(products, batch_size=400):
+    """Save products through batch writes; returns the number saved"""
+    db = get_db()
+    if not db:
+        print("Product store not initialized. Skipping database save.")
+        return 0
+
+    products = [product for product in products if product.get('asin')]
+    saved = 0
+    for start in range(0, len(products), batch_size):
+        chunk = products[start:start + batch_size]
+        try:
+            batch = db.batch()
+            for product_data in chunk:
+                batch.set(db.collection('products').document(product_data['asin']), with_query_fields(product_data),
+                          merge=True)
+            batch.commit()
+            saved += len(chunk)
+        except Exception as e:
+            print(f"Error saving batch to Firestore: {str(e)}")
+    return saved
+
+def parse_detail_page(html, asin):
+    """Extract a product from detail-page HTML"""
+    soup = make_soup(html)
+    try:
+        return extract_product_info(soup, asin, layout_fingerprint(html, 'detail'))
+    finally:
+        release_soup(soup)
+
+def listing_asins_from_tree(html, limit=None):
+    """Product ASINs from the parsed listing page, for pages the byte scan can't read"""
+    asins = []
+    seen = set()
+    soup = make_soup(html)
+    for link in soup.select('div[data-asin] a[href*="/dp/"]'):
+        asin = extract_asin(link.get('href') or '')
+        if asin and asin not in seen:
+            seen.add(asin)
+            asins.append(asin)
+            if limit is not None and len(asins) >= limit:
+                break
+    release_soup(soup)
+    return asins
+
+def deal_asins_from_tree(html):
+    """Deal ASINs from the parsed deals page, skipping deal-card selectors that keep missing"""
+    soup = make_soup(html)
+    layout = layout_fingerprint(html, 'deals')
+    stats = get_selector_stats()
+    
+    # Try different selectors for deal items, ones that keep missing on this layout last
+    deal_selectors = [
+        'div[data-testid="deal-card"]',
+        'div.DealGridItem-module__dealItem',
+        'div.a-section.a-spacing-none.tallCellView',
+        'div[data-component-type="deal"]'
+    ]
+    
+    for selector in stats.ordered(layout, 'deal_card', deal_selectors):
+        deals = soup.select(selector)
+        stats.record(layout, 'deal_card', selector, bool(deals))
+        asins = []
+        seen = set()
+        for deal in deals:
+            link = deal.find('a', href=True)
+            asin = extract_asin(link['href']) if link and '/dp/' in link['href'] else None
+            if asin and asin not in seen:
+                seen.add(asin)
+                asins.append(asin)
+        if asins:  # If we found products with this selector, stop trying others
+            release_soup(soup)
+            return asins
+    release_soup(soup)
+    return []
+
+def scrape_deals_page(max_requests=None, save=True):
+    """Specialized function for scraping the deals page.
+
+    max_requests caps the HTTP requests this call may make, and so the number
+    of deals; without it at most 12 deals are scraped. save=False leaves
+    saving the returned products to the caller.
+    """
     deals_urls = [
         'https://www.amazon.com/deals?ref_=nav_cs_gb',
         'https://www.amazon.com/gp/goldbox',
@@ -183,51 +446,37 @@ def scrape_deals_page():
     ]
     
     products = []
+    start_count = requests_made()
     for url in deals_urls:
+        if max_requests is not None and requests_made() - start_count >= max_requests:
+            break
         try:
-            response = requests.get(url, headers=get_headers(), timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+            response = fetch(url)
             
-            # Try different selectors for deal items
-            deal_selectors = [
-                'div[data-testid="deal-card"]',
-                'div.DealGridItem-module__dealItem',
-                'div.a-section.a-spacing-none.tallCellView',
-                'div[data-component-type="deal"]'
-            ]
+            # Only the deal cards: a byte scan would also pick up the recently-viewed
+            # and sponsored strips, which aren't deals
+            asins = deal_asins_from_tree(response.text)
+            response = None
             
-            for selector in deal_selectors:
-                deals = soup.select(selector)
-                if deals:
-                    for deal in deals:
-                        try:
-                            link = deal.find('a', href=True)
-                            if link and '/dp/' in link['href']:
-                                full_url = f"https://www.amazon.com{link['href']}" if link['href'].startswith('/') else link['href']
-                                affiliate_link = create_affiliate_link(full_url)
-                                if affiliate_link:
-                                    response = requests.get(affiliate_link, headers=get_headers(), timeout=10)
-                                    response.raise_for_status()
-                                    product_soup = BeautifulSoup(response.text, 'html.parser')
-                                    asin = extract_asin(affiliate_link)
-                                    if asin:
-                                        product_data = extract_product_info(product_soup, asin)
-                                        if product_data:
-                                            products.append(product_data)
-                                            save_to_firestore(product_data)
-                                            
-                                            if len(products) >= 12:  # Limit to 12 products
-                                                return products
-                                            
-                                            time.sleep(random.uniform(1, 2))  # Random delay
-                        except Exception as e:
-                            print(f"Error processing deal: {str(e)}")
-                            continue
-                    
-                    if products:  # If we found products with this selector, stop trying others
-                        break
+            for position, asin in enumerate(asins, 1):
+                if max_requests is not None and requests_made() - start_count >= max_requests:
+                    return products
+                try:
+                    product_data = parse_detail_page(fetch(create_affiliate_link(f"/dp/{asin}/")).text, asin)
+                    if product_data:
+                        product_data['source'] = 'amazon_deals'
+                        product_data['source_rank'] = position
+                        products.append(product_data)
+                        if save:
+                            save_to_firestore(product_data)
+                        
+                        if max_requests is None and len(products) >= 12:  # Limit to 12 products
+                            return products
+                        
+                        polite_delay(1, 2)  # Random delay
+                except Exception as e:
+                    print(f"Error processing deal: {str(e)}")
+                    continue
             
             if products:  # If we found products on this URL, stop trying others
                 break
@@ -238,84 +487,126 @@ def scrape_deals_page():
             
     return products
 
-def scrape_amazon_page(url, source_name):
+def scrape_amazon_page(url, source_name, listing_first=True, max_products=12, max_requests=None, save=True):
+    """Scrape a listing page.
+
+    With listing_first, products are built straight from the listing cards and
+    only ASINs whose cards lack a required field get a detail-page request.
+    Otherwise (opt-in) the grid card ASINs are read from the raw bytes and every
+    ASIN is fetched from its detail page. max_products=None
+    removes the per-page cap, max_requests caps the HTTP requests this call may
+    make, and save=False leaves saving the returned products to the caller.
+    """
     max_retries = 3
     retry_delay = 2
     products = []
+    start_count = requests_made()
     
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=get_headers(), timeout=10)
-            response.raise_for_status()
+            response = fetch(url)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            listing_products = {}
             product_links = []
             
-            # Find product links
-            for link in soup.select('div[data-asin] a[href*="/dp/"]'):
-                href = link.get('href')
-                if href and '/dp/' in href:
-                    full_url = f'https://www.amazon.com{href}' if href.startswith('/') else href
-                    affiliate_link = create_affiliate_link(full_url)
-                    if affiliate_link and affiliate_link not in product_links:
-                        product_links.append(affiliate_link)
-                        if len(product_links) >= 12:  # Increased to 12 products per page
-                            break
+            if listing_first:
+                soup = make_soup(response.text)
+                response = None  # the tree has everything needed from the body
+                for card in soup.select('div[data-asin]'):
+                    product_data = extract_listing_product(card)
+                    if not product_data or product_data['asin'] in listing_products:
+                        continue
+                    listing_products[product_data['asin']] = product_data
+                    product_data['source_rank'] = len(listing_products)  # position on the list
+                    if is_complete_product(product_data):
+                        product_data['source'] = source_name
+                        products.append(product_data)
+                        if save:
+                            save_to_firestore(product_data)
+                    else:
+                        product_links.append(create_affiliate_link(f"/dp/{product_data['asin']}/"))
+                    if max_products is not None and len(listing_products) >= max_products:
+                        break
+                release_soup(soup)
+            else:
+                # Find product links in the raw bytes; parse the page only if that finds nothing
+                asins = discover_asins(response.content, max_products) or listing_asins_from_tree(response.text,
+                                                                                               max_products)
+                response = None
+                product_links = [create_affiliate_link(f"/dp/{asin}/") for asin in asins]
             
             # Get detailed product info
-            for link in product_links:
+            for position, link in enumerate(product_links, 1):
+                if max_requests is not None and requests_made() - start_count >= max_requests:
+                    break
                 asin = extract_asin(link)
                 if asin:
                     try:
-                        response = requests.get(link, headers=get_headers(), timeout=10)
-                        response.raise_for_status()
-                        product_soup = BeautifulSoup(response.text, 'html.parser')
-                        product_data = extract_product_info(product_soup, asin)
+                        product_data = merge_product_info(listing_products.get(asin),
+                                                          parse_detail_page(fetch(link).text, asin))
                         
                         if product_data:
                             product_data['source'] = source_name
+                            product_data.setdefault('source_rank', position)
                             products.append(product_data)
                             # Save to Firestore
-                            save_to_firestore(product_data)
+                            if save:
+                                save_to_firestore(product_data)
                             
-                        time.sleep(random.uniform(1, 2))  # Random delay between requests
+                        polite_delay(1, 2)  # Random delay between requests
                     except Exception as e:
                         print(f"Error processing product {asin}: {str(e)}")
                         continue
             
+            if listing_first:
+                print(f"{len(listing_products)} listing cards, {len(product_links)} detail fetches")
             return products
             
         except requests.RequestException as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay + random.uniform(0, 1))
+            retryable = not isinstance(e, (CircuitOpen, DeadlineExceeded))
+            if retryable and attempt < max_retries - 1 and (max_requests is None or requests_made() - start_count < max_requests):
+                polite_delay(retry_delay, retry_delay + 1)
                 continue
             print(f"Error after {max_retries} attempts: {str(e)}")
             return []
 
-def scrape_all_sources():
-    sources = {
-        'amazon_best_sellers': 'https://www.amazon.com/Best-Sellers/zgbs',
-        'amazon_movers_shakers': 'https://www.amazon.com/gp/movers-and-shakers/',
-        'amazon_most_wished': 'https://www.amazon.com/gp/most-wished-for/',
-        'amazon_new_releases': 'https://www.amazon.com/gp/new-releases/'
-    }
-    
+SOURCES = {
+    'amazon_best_sellers': 'https://www.amazon.com/Best-Sellers/zgbs',
+    'amazon_movers_shakers': 'https://www.amazon.com/gp/movers-and-shakers/',
+    'amazon_most_wished': 'https://www.amazon.com/gp/most-wished-for/',
+    'amazon_new_releases': 'https://www.amazon.com/gp/new-releases/'
+}
+
+def scrape_all_sources(listing_first=True, request_budget=None, time_budget=None):
+    """Scrape every source.
+
+    With a request_budget (and optional time_budget in seconds) the budget is
+    split between sources by their historical yield, see crawl_scheduler.py.
+    Without one, every source is scraped in a fixed order.
+    """
+    if request_budget:
+        from crawl_scheduler import CrawlScheduler, default_sources
+        scheduler = CrawlScheduler(default_sources(listing_first), request_budget=request_budget,
+                                   time_budget=time_budget)
+        return scheduler.run()
+
     all_products = []
+    profiler = get_memory_profiler()
     
     # Scrape regular pages
-    for source_name, url in sources.items():
+    for source_name, url in SOURCES.items():
         print(f"\nScraping {source_name}...")
-        products = scrape_amazon_page(url, source_name)
+        with profiler.stage(source_name):
+            products = scrape_amazon_page(url, source_name, listing_first=listing_first)
         all_products.extend(products)
         print(f"Found {len(products)} products from {source_name}")
-        time.sleep(random.uniform(2, 3))  # Delay between different sources
+        polite_delay(2, 3)  # Delay between different sources
     
     # Scrape deals page separately
     print("\nScraping amazon_deals...")
-    deal_products = scrape_deals_page()
+    with profiler.stage('amazon_deals'):
+        deal_products = scrape_deals_page()
     if deal_products:
-        for product in deal_products:
-            product['source'] = 'amazon_deals'
         all_products.extend(deal_products)
         print(f"Found {len(deal_products)} products from amazon_deals")
     
@@ -332,7 +623,18 @@ def save_links_to_file(products, filename='deals.txt'):
 
 def main():
     print("Starting Amazon product scraper...")
-    products = scrape_all_sources()
+    get_selector_stats().attach(get_db())
+    request_budget = int(os.getenv('REQUEST_BUDGET', '0')) or None
+    time_budget = float(os.getenv('TIME_BUDGET', '0')) or None
+    # Requests never run past the run's time budget, however slow a response is
+    get_fetcher().set_deadline(time_budget)
+    products = scrape_all_sources(request_budget=request_budget, time_budget=time_budget)
+    print(f"\nFetch summary: {get_fetcher().report()}")
+    
+    selector_stats = get_selector_stats()
+    selector_stats.save()
+    selector_stats.print_report()
+    get_memory_profiler().print_report()
     
     if products:
         save_links_to_file(products)
@@ -2,10 +2,11 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
 
-# Initialize Firebase
-cred = credentials.Certificate('serviceAccountKey.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+def init_firestore():
+    """Initialize Firebase and return a Firestore client"""
+    cred = credentials.Certificate('serviceAccountKey.json')
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
 
 # Sample products data
 sample_products = [
@@ -41,7 +42,7 @@ sample_products = [
     }
 ]
 
-def add_products():
+def add_products(db):
     for product in sample_products:
         # Use ASIN as document ID
         doc_ref = db.collection('products').document(product['asin'])
@@ -49,5 +50,5 @@ def add_products():
         print(f"Added product: {product['title']}")
 
 if __name__ == "__main__":
-    add_products()
+    add_products(init_firestore())
     print("All sample products added to Firestore!") 
\ No newline at end of file
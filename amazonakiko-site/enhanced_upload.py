@@ -6,9 +6,11 @@ from PIL import Image
 import io
 import time
 import logging
+import threading
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
 import json
 
 # Configure logging
@@ -22,25 +24,41 @@ logging.basicConfig(
 )
 
 class ImageUploader:
-    def __init__(self):
-        # Initialize Firebase
-        cred = credentials.Certificate('serviceAccountKey.json')
-        firebase_admin.initialize_app(cred, {
-            'storageBucket': 'test1-1d33b.appspot.com'
-        })
-        self.db = firestore.client()
-        self.bucket = storage.bucket()
+    def __init__(self, db=None, bucket=None):
+        # Initialize Firebase unless a store/bucket is injected (e.g. an
+        # in-memory product store for local runs and load tests)
+        if db is None or bucket is None:
+            cred = credentials.Certificate('serviceAccountKey.json')
+            firebase_admin.initialize_app(cred, {
+                'storageBucket': 'test1-1d33b.appspot.com'
+            })
+        self.db = db if db is not None else firestore.client()
+        self.bucket = bucket if bucket is not None else storage.bucket()
         
         # Configuration
         self.max_retries = 3
         self.retry_delay = 5  # seconds
         self.max_workers = 5  # concurrent uploads
+        self.status_batch_size = 100  # Firestore allows up to 500 writes per batch
+        self.resumable_threshold = 5 * 1024 * 1024  # bytes; larger uploads go resumable
+        self.resumable_chunk_size = 1024 * 1024  # must be a multiple of 256 KB
         self.optimize_config = {
             'max_size': (800, 800),
             'quality': 85,
             'format': 'JPEG'
         }
 
+        # Pending Firestore status updates, committed in batch writes
+        self._pending_updates = []
+        self._committed_asins = []  # committed since the last flush
+        self._pending_lock = threading.Lock()
+
+        # Size the Storage HTTP connection pool to match the worker count so
+        # concurrent uploads reuse connections instead of reconnecting
+        if bucket is None:
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            self.bucket.client._http.mount('https://', adapter)
+
     def optimize_image(self, image_data: bytes) -> bytes:
         """Optimize image before upload"""
         try:
@@ -84,27 +102,26 @@ class ImageUploader:
         """Upload image to Firebase with retry logic"""
         try:
             blob = self.bucket.blob(f'products/{asin}.jpg')
-            
-            # Upload with metadata
+            blob.metadata = {
+                'uploaded_at': datetime.utcnow().isoformat(),
+                'asin': asin
+            }
+
+            # Small images go up in a single multipart request; large ones use
+            # a resumable session so a dropped connection doesn't restart the upload
+            if len(image_data) > self.resumable_threshold:
+                blob.chunk_size = self.resumable_chunk_size
+
+            # Public-read is applied at upload time, no separate make_public() call
             blob.upload_from_string(
                 image_data,
                 content_type='image/jpeg',
-                metadata={
-                    'uploaded_at': datetime.utcnow().isoformat(),
-                    'asin': asin
-                }
+                predefined_acl='publicRead'
             )
-            
-            # Make public
-            blob.make_public()
-            
-            # Update Firestore with upload status
-            self.db.collection('products').document(asin).update({
-                'image_uploaded': True,
-                'image_url': blob.public_url,
-                'last_updated': firestore.SERVER_TIMESTAMP
-            })
-            
+
+            # Status update is queued and committed with the next batch write
+            self.queue_status_update(asin, blob.public_url)
+
             return True
         except Exception as e:
             if retry_count < self.max_retries:
@@ -114,6 +131,56 @@ class ImageUploader:
             logging.error(f"Upload failed after {self.max_retries} attempts: {str(e)}")
             return False
 
+    def queue_status_update(self, asin: str, image_url: str):
+        """Queue a Firestore status update, committing once a full batch is pending"""
+        with self._pending_lock:
+            self._pending_updates.append((asin, image_url))
+            if len(self._pending_updates) < self.status_batch_size:
+                return
+            pending = self._pending_updates
+            self._pending_updates = []
+        committed = self.commit_status_updates(pending)
+        with self._pending_lock:
+            self._committed_asins.extend(committed)
+
+    def flush_status_updates(self) -> List[str]:
+        """Commit any queued Firestore status updates.
+
+        Returns the ASINs whose updates were committed since the last flush,
+        including batches committed as they filled up.
+        """
+        with self._pending_lock:
+            pending = self._pending_updates
+            self._pending_updates = []
+        committed = self.commit_status_updates(pending)
+        with self._pending_lock:
+            committed = self._committed_asins + committed
+            self._committed_asins = []
+        return committed
+
+    def commit_status_updates(self, updates: List, retry_count: int = 0) -> List[str]:
+        """Write image status updates to Firestore in a single batch; returns the committed ASINs"""
+        if not updates:
+            return []
+        try:
+            batch = self.db.batch()
+            for asin, image_url in updates:
+                batch.update(self.db.collection('products').document(asin), {
+                    'image_uploaded': True,
+                    'image_url': image_url,
+                    'last_updated': firestore.SERVER_TIMESTAMP
+                })
+            batch.commit()
+            logging.info(f"Committed {len(updates)} status updates")
+            return [asin for asin, _ in updates]
+        except Exception as e:
+            if retry_count < self.max_retries:
+                logging.warning(f"Status batch failed (attempt {retry_count + 1}/{self.max_retries}): {str(e)}")
+                time.sleep(self.retry_delay * (retry_count + 1))
+                return self.commit_status_updates(updates, retry_count + 1)
+            logging.error(f"Status batch failed after {self.max_retries} attempts: {str(e)}")
+            return []
+
     def process_product(self, product: Dict) -> Dict:
         """Process a single product"""
         start_time = time.time()
@@ -165,6 +232,14 @@ class ImageUploader:
                         'status': 'failed',
                         'error': str(e)
                     })
+
+        # Commit whatever is left of this batch's status updates; an upload
+        # only counts once its status update is in Firestore
+        committed = set(self.flush_status_updates())
+        for result in results:
+            if result['status'] == 'success' and result['asin'] not in committed:
+                result['status'] = 'failed'
+                result['error'] = 'status_update_failed'
         
         return results
 
@@ -3,8 +3,10 @@ import {
   getFirestore,
   collection,
   query,
+  where,
   orderBy,
   limit,
+  startAfter,
   getDocs
 } from "https://www.gstatic.com/firebasejs/10.10.0/firebase-firestore.js";
 import { firebaseConfig } from './firebase-config.js';
@@ -25,6 +27,61 @@ try {
 }
 
 const productGrid = document.getElementById("product-grid");
+const loadMoreButton = document.getElementById("load-more");
+const sortSelect = document.getElementById("sort");
+const sourceSelect = document.getElementById("source");
+
+const PAGE_SIZE = 24;
+
+// Sort orders over the numeric fields the scrapers store (see product_fields.py);
+// the composite indexes for each one combined with a source filter are in firestore.indexes.json.
+// "rank" sorts on the selected source's own rank field, rank_<source>.
+const SORTS = {
+  newest: [["timestamp", "desc"]],
+  price_low: [["price_cents", "asc"]],
+  price_high: [["price_cents", "desc"]],
+  rating: [["rating_x10", "desc"], ["review_count", "desc"]],
+  reviews: [["review_count", "desc"]],
+  discount: [["discount_pct", "desc"]]
+};
+
+/**
+ * Fetch one page of products, sorted and filtered server-side.
+ * Pass the returned cursor back in to get the next page.
+ * Products missing the sort field are left out by Firestore.
+ */
+export async function fetchProductPage({ sort = "newest", source = null, pageSize = PAGE_SIZE, cursor = null } = {}) {
+  const constraints = [];
+  if (sort === "rank" && source) {
+    // Only products on that source's list have its rank field, so no source filter is needed
+    constraints.push(orderBy(`rank_${source}`, "asc"));
+  } else {
+    if (source) {
+      constraints.push(where("source", "==", source));
+    }
+    for (const [field, direction] of SORTS[sort] || SORTS.newest) {
+      constraints.push(orderBy(field, direction));
+    }
+  }
+  if (cursor) {
+    constraints.push(startAfter(cursor));
+  }
+  constraints.push(limit(pageSize));
+
+  const snapshot = await getDocs(query(collection(db, "products"), ...constraints));
+  return {
+    products: snapshot.docs.map(doc => ({ id: doc.id, data: doc.data() })),
+    cursor: snapshot.docs.length ? snapshot.docs[snapshot.docs.length - 1] : null,
+    hasMore: snapshot.docs.length === pageSize
+  };
+}
+
+// Paging state of the grid
+let pageCursor = null;
+let hasMore = false;
+let loading = false;
+// Bumped by every load; a load that finds it changed has been superseded and drops its results
+let loadToken = 0;
 
 function cleanTitle(rawTitle) {
   return rawTitle.split("$")[0].trim();
@@ -60,7 +117,7 @@ function createCard(data, asin) {
 
   const title = cleanTitle(data.title || "");
   const price = data.price || "N/A";
-  const rating = data.rating || "?";
+  const rating = data.rating_x10 != null ? (data.rating_x10 / 10).toFixed(1) : (data.rating || "?");
   const reviews = formatNumber(data.review_count || "0");
   const isBestseller = data.source === "amazon_best_sellers";
 
@@ -108,50 +165,47 @@ function showNoProducts() {
   `;
 }
 
-async function loadProducts() {
+async function loadProducts(append = false) {
   if (!db) {
     console.error("Firestore not initialized");
     return;
   }
+  // "Load more" waits for the current load; a new sort or filter replaces it
+  if (loading && append) return;
+  const token = ++loadToken;
+  loading = true;
 
-  showLoading();
+  if (!append) {
+    pageCursor = null;
+    showLoading();
+  }
+  loadMoreButton.hidden = true;
 
   try {
-    const q = query(
-      collection(db, "products"),
-      orderBy("timestamp", "desc"),
-      limit(100)
-    );
-    const snapshot = await getDocs(q);
-    
-    // Filter products with valid Amazon images
-    const validProducts = [];
-    const validationPromises = [];
-    
-    snapshot.forEach(doc => {
-      const data = doc.data();
-      if (data.image) {
-        validationPromises.push(
-          validateImageUrl(data.image)
-            .then(isValid => {
-              if (isValid) {
-                validProducts.push({ id: doc.id, data });
-              }
-            })
-        );
-      }
+    const page = await fetchProductPage({
+      sort: sortSelect.value,
+      source: sourceSelect.value || null,
+      cursor: pageCursor
     });
+    if (token !== loadToken) return;
+    pageCursor = page.cursor;
+    hasMore = page.hasMore;
     
-    // Wait for all image validations to complete
-    await Promise.all(validationPromises);
+    // Filter products with valid Amazon images, keeping the page's order
+    const checks = await Promise.all(
+      page.products.map(({ data }) => data.image ? validateImageUrl(data.image) : false)
+    );
+    if (token !== loadToken) return;
+    const validProducts = page.products.filter((_, i) => checks[i]);
 
-    if (validProducts.length === 0) {
-      showNoProducts();
-      return;
+    if (!append) {
+      if (validProducts.length === 0 && !hasMore) {
+        showNoProducts();
+        return;
+      }
+      // Clear existing content
+      productGrid.innerHTML = "";
     }
-
-    // Clear existing content
-    productGrid.innerHTML = "";
     
     // Create a document fragment for better performance
     const fragment = document.createDocumentFragment();
@@ -162,7 +216,9 @@ async function loadProducts() {
     });
     
     productGrid.appendChild(fragment);
+    loadMoreButton.hidden = !hasMore;
   } catch (error) {
+    if (token !== loadToken) return;
     console.error("Error loading products:", error);
     productGrid.innerHTML = `
       <div class="error-message">
@@ -170,9 +226,16 @@ async function loadProducts() {
         <button onclick="loadProducts()">Retry</button>
       </div>
     `;
+  } finally {
+    if (token === loadToken) {
+      loading = false;
+    }
   }
 }
 
+// Inline onclick handlers run in the global scope, outside this module
+window.loadProducts = loadProducts;
+
 // Add styles
 const style = document.createElement('style');
 style.textContent = `
@@ -245,5 +308,19 @@ style.textContent = `
 `;
 document.head.appendChild(style);
 
-// Load products when the page loads
-document.addEventListener('DOMContentLoaded', loadProducts); 
\ No newline at end of file
+// Load products when the page loads, and again from the first page when the sort or filter changes
+document.addEventListener('DOMContentLoaded', () => loadProducts());
+sortSelect.addEventListener('change', () => {
+  // Rank is a position within one source's list, so it needs a source
+  if (sortSelect.value === "rank" && !sourceSelect.value) {
+    sourceSelect.value = "amazon_best_sellers";
+  }
+  loadProducts();
+});
+sourceSelect.addEventListener('change', () => {
+  if (sortSelect.value === "rank" && !sourceSelect.value) {
+    sortSelect.value = "newest";
+  }
+  loadProducts();
+});
+loadMoreButton.addEventListener('click', () => loadProducts(true)); 
\ No newline at end of file
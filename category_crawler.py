@@ -0,0 +1,365 @@
+"""Budgeted breadth-first crawler for Amazon ranking categories.
+
+Starting from the top-level ranking pages in amazon_affiliate_scraper.SOURCES,
+the crawler discovers best-seller / new-release / movers-and-shakers
+subcategory and pagination links and walks them breadth-first up to a depth
+limit. Every page request counts against a global request budget, and pages
+that produced new ASINs get their children visited first, so the budget goes
+to the parts of the tree that keep yielding products.
+
+    python category_crawler.py --budget 2000 --depth 3
+
+With --shards N the crawl is split between every worker started under the same
+CRAWL_RUN_ID: each crawls only the categories in the shards it leases and
+hands other categories over through the shared frontier (see crawl_shards.py).
+"""
+import argparse
+import heapq
+import itertools
+import re
+import sys
+import time
+from collections import deque
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import requests
+
+from amazon_affiliate_scraper import (
+    SOURCES,
+    create_affiliate_link,
+    extract_listing_product,
+    fetch,
+    get_db,
+    get_fetcher,
+    get_memory_profiler,
+    get_selector_stats,
+    is_complete_product,
+    make_soup,
+    merge_product_info,
+    parse_detail_page,
+    polite_delay,
+    release_soup,
+    requests_made,
+    save_many_to_firestore,
+)
+from crawl_shards import ShardLeases
+from hedged_fetch import DeadlineExceeded
+from memory_profile import bounded_memory, max_in_flight
+
+BASE_URL = 'https://www.amazon.com'
+
+# Ranking lists whose subcategory and pagination links the crawler follows
+CATEGORY_PATH_RE = re.compile(
+    r'^/(?:[^/]+/)?(zgbs|gp/bestsellers|new-releases|gp/new-releases|'
+    r'movers-and-shakers|gp/movers-and-shakers|most-wished-for|gp/most-wished-for)(/|$)'
+)
+REF_SEGMENT_RE = re.compile(r'/ref=[^/]*$')
+
+def normalize_category_url(href):
+    """Return a canonical ranking-page URL for href, or None if it isn't one.
+
+    Drops ref= tracking segments and every query parameter except the page number,
+    so the same category reached from different pages is only crawled once.
+    """
+    if not href:
+        return None
+    parsed = urlparse(urljoin(BASE_URL, href))
+    if parsed.netloc and not parsed.netloc.endswith('amazon.com'):
+        return None
+    path = REF_SEGMENT_RE.sub('', parsed.path).rstrip('/') or '/'
+    if not CATEGORY_PATH_RE.match(path):
+        return None
+    page = parse_qs(parsed.query).get('pg', ['1'])[0]
+    if page.isdigit() and int(page) > 1:
+        return f"{BASE_URL}{path}?pg={int(page)}"
+    return f"{BASE_URL}{path}"
+
+def category_key(url):
+    """The category a (possibly paginated) URL belongs to"""
+    return url.split('?', 1)[0]
+
+class CategoryCrawler:
+    """Breadth-first, yield-prioritized crawl of ranking categories under a request budget"""
+
+    def __init__(self, seeds=None, max_depth=3, request_budget=500, detail_share=0.1,
+                 known_asins=None, delay=(1, 2), shards=None, idle_seconds=60, bounded=None):
+        self.seeds = seeds or SOURCES
+        self.max_depth = max_depth
+        self.request_budget = request_budget
+        # Share of the budget held back for detail pages of incomplete listing cards
+        self.detail_share = detail_share
+        self.delay = delay
+        # ShardLeases of this worker in a sharded crawl, None to crawl everything
+        self.shards = shards
+        # How long a sharded worker waits for other workers to hand it new categories
+        self.idle_seconds = idle_seconds
+        # Bounded memory: products are saved and dropped instead of returned, and
+        # once max_in_flight listing cards wait for a detail fetch the crawl
+        # completes them before crawling on
+        self.bounded = bounded_memory() if bounded is None else bounded
+        self.max_in_flight = max_in_flight() if self.bounded else None
+        self.products_found = 0
+        self.dropped_incomplete = 0
+        self.detail_requests = 0
+
+        self._start_requests = requests_made()
+        self.out_of_time = False
+        self.seen_asins = set(known_asins or ())
+        self.visited = set()
+        self.category_yield = {}  # category URL -> new ASINs found across its pages
+        self.incomplete = deque()  # listing products awaiting a detail fetch
+        self._queue = []
+        self._counter = itertools.count()
+        self._published = []
+        self._queued = set()
+        self._crawled = set()
+
+    @property
+    def requests_used(self):
+        """HTTP requests spent by this crawl, hedged duplicates included"""
+        return requests_made() - self._start_requests
+
+    def _push(self, url, source_name, depth, parent_yield, found_on=None):
+        if url in self.visited or depth > self.max_depth:
+            return
+        self.visited.add(url)
+        if self.shards:
+            # Every category goes through the shared frontier so a shard's next owner can resume it
+            self._published.append({'url': url, 'key': category_key(url), 'source': source_name,
+                                    'depth': depth, 'priority': parent_yield, 'found_on': found_on})
+            if not self.shards.owns(category_key(url)):
+                return
+        self._enqueue(url, source_name, depth, parent_yield)
+
+    def _enqueue(self, url, source_name, depth, parent_yield):
+        # Shallower pages first; within a depth, children of productive pages first
+        self._queued.add(url)
+        heapq.heappush(self._queue, (depth, -parent_yield, next(self._counter), url, source_name))
+
+    def _fetch(self, url):
+        try:
+            return fetch(url).text
+        except DeadlineExceeded:
+            self.out_of_time = True
+            return None
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {str(e)}")
+            return None
+        finally:
+            polite_delay(*self.delay)
+
+    def crawl_page(self, url, source_name, depth):
+        """Fetch one ranking page; returns (new products, discovered category URLs)"""
+        html = self._fetch(url)
+        if html is None:
+            return [], []
+        soup = make_soup(html)
+
+        products = []
+        for card in soup.select('div[data-asin]'):
+            product_data = extract_listing_product(card)
+            if not product_data or product_data['asin'] in self.seen_asins:
+                continue
+            self.seen_asins.add(product_data['asin'])
+            product_data['source'] = source_name
+            product_data['category'] = category_key(url)
+            if is_complete_product(product_data):
+                products.append(product_data)
+            else:
+                self.incomplete.append(product_data)
+
+        links = []
+        for link in soup.find_all('a', href=True):
+            category_url = normalize_category_url(link['href'])
+            if category_url and category_url != url:
+                links.append(category_url)
+        release_soup(soup)
+        return products, links
+
+    def _save(self, products):
+        """Save products; returns the ones to keep in the crawl's result (none when bounded)"""
+        if self.shards:
+            products = self.shards.unwritten(products)
+        if products:
+            save_many_to_firestore(products)
+        self.products_found += len(products)
+        return [] if self.bounded else products
+
+    def _publish(self):
+        if self._published:
+            self.shards.publish(self._published)
+            self._published = []
+
+    def _sync_frontier(self):
+        """Publish newly found categories and queue the frontier's pending ones for our shards"""
+        self._publish()
+        for entry in self.shards.pending():
+            url = entry['url']
+            if url not in self._crawled and url not in self._queued:
+                self.visited.add(url)
+                self._enqueue(url, entry['source'], entry['depth'], entry.get('priority', 0))
+
+    def _next_page(self):
+        """Pop the next category page to crawl, waiting for handed-over work in a sharded crawl"""
+        waited_until = time.monotonic() + self.idle_seconds
+        while True:
+            if not self._queue and self.shards:
+                self._sync_frontier()
+            while self._queue:
+                item = heapq.heappop(self._queue)
+                self._queued.discard(item[3])
+                # Skip pages whose shard moved to another worker since they were queued
+                if not self.shards or self.shards.owns(category_key(item[3])):
+                    return item
+            if not self.shards or time.monotonic() >= waited_until:
+                return None
+            time.sleep(5)
+
+    def crawl(self):
+        """Run the crawl and return every complete product found.
+
+        In bounded-memory mode products are only saved, and the returned list
+        is empty; products_found has the count.
+        """
+        profiler = get_memory_profiler()
+        with profiler.stage('category pages'):
+            all_products = self._crawl_pages(profiler)
+        with profiler.stage('detail pages'):
+            all_products.extend(self.fetch_incomplete())
+        print(f"\nCrawl finished: {self.products_found} products, {len(self.category_yield)} categories, "
+              f"{self.requests_used} requests")
+        if self.dropped_incomplete:
+            print(f"{self.dropped_incomplete} incomplete listing cards dropped (MAX_IN_FLIGHT_DOCS, detail budget spent)")
+        return all_products
+
+    def _crawl_pages(self, profiler):
+        """Crawl ranking pages within the page budget; returns the products to keep"""
+        for source_name, url in self.seeds.items():
+            self._push(normalize_category_url(url) or url, source_name, 0, 0)
+
+        page_budget = int(self.request_budget * (1 - self.detail_share))
+        detail_budget = self.request_budget - page_budget
+        all_products = []
+        crawled = []
+        while self.requests_used - self.detail_requests < page_budget and not self.out_of_time:
+            item = self._next_page()
+            if item is None:
+                break
+            depth, _, _, url, source_name = item
+            self._crawled.add(url)
+            products, links = self.crawl_page(url, source_name, depth)
+            if products:
+                all_products.extend(self._save(products))
+
+            category = category_key(url)
+            self.category_yield[category] = self.category_yield.get(category, 0) + len(products)
+            print(f"[{self.requests_used}/{self.request_budget}] depth {depth} {url}: "
+                  f"{len(products)} new products, {len(links)} links")
+            if len(self._crawled) % 100 == 0:
+                profiler.sample()
+            if self.max_in_flight is not None and len(self.incomplete) >= self.max_in_flight:
+                all_products.extend(self._relieve_backpressure(detail_budget))
+
+            for link in links:
+                if category_key(link) == category:
+                    # Next page of the same list: only worth it while the list keeps producing
+                    if products:
+                        self._push(link, source_name, depth, len(products), category)
+                else:
+                    self._push(link, source_name, depth + 1, len(products), category)
+
+            if self.shards:
+                crawled.append({'url': url, 'key': category})
+                if len(crawled) >= 10:
+                    self.shards.mark_done(crawled)
+                    crawled = []
+                    self._sync_frontier()
+
+        if self.shards:
+            # Unvisited categories stay pending in the frontier; the next owner of their shard,
+            # in this run or the next, picks them up
+            self._publish()
+            self.shards.mark_done(crawled)
+        return all_products
+
+    def _relieve_backpressure(self, detail_budget):
+        """Complete queued cards from the detail budget until the queue is half empty.
+
+        Once the detail budget is spent, cards beyond max_in_flight could never be
+        completed in this run, so they are dropped rather than held.
+        """
+        saved = self.fetch_incomplete(keep=self.max_in_flight // 2,
+                                      max_detail_requests=detail_budget - self.detail_requests)
+        while len(self.incomplete) > self.max_in_flight:
+            self.incomplete.pop()
+            self.dropped_incomplete += 1
+        return saved
+
+    def fetch_incomplete(self, flush_every=400, keep=0, max_detail_requests=None):
+        """Spend the remaining budget completing listing cards from their detail pages.
+
+        Stops with `keep` cards still queued, or after max_detail_requests requests.
+        """
+        saved = []
+        products = []
+        start = self.detail_requests
+        while (len(self.incomplete) > keep and self.requests_used < self.request_budget and not self.out_of_time
+               and (max_detail_requests is None or self.detail_requests - start < max_detail_requests)):
+            listing_data = self.incomplete.popleft()
+            before = requests_made()
+            html = self._fetch(create_affiliate_link(f"/dp/{listing_data['asin']}/"))
+            self.detail_requests += requests_made() - before
+            if html is None:
+                continue
+            product_data = merge_product_info(listing_data, parse_detail_page(html, listing_data['asin']))
+            if product_data and is_complete_product(product_data):
+                products.append(product_data)
+            if len(products) >= flush_every:
+                saved.extend(self._save(products))
+                products = []
+        saved.extend(self._save(products))
+        return saved
+
+def main():
+    parser = argparse.ArgumentParser(description="Breadth-first crawl of Amazon ranking categories")
+    parser.add_argument('--budget', type=int, default=500, help="maximum number of HTTP requests")
+    parser.add_argument('--depth', type=int, default=3, help="maximum subcategory depth")
+    parser.add_argument('--detail-share', type=float, default=0.1,
+                        help="fraction of the budget reserved for detail pages")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="stop issuing requests after this many seconds")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="split the crawl into this many shards shared with other workers")
+    parser.add_argument('--worker-id', default=None, help="this worker's name in shard leases")
+    args = parser.parse_args()
+
+    get_selector_stats().attach(get_db())
+    get_fetcher().set_deadline(args.time_budget)
+
+    shards = None
+    if args.shards:
+        db = get_db()
+        if not db:
+            print("❌ A sharded crawl needs the product store for its leases")
+            sys.exit(1)
+        shards = ShardLeases(db, shard_count=args.shards, worker_id=args.worker_id)
+        print(f"Cleaned up {shards.cleanup()} crawl documents of past runs")
+        shards.start()
+
+    crawler = CategoryCrawler(max_depth=args.depth, request_budget=args.budget, detail_share=args.detail_share,
+                              shards=shards)
+    try:
+        crawler.crawl()
+    finally:
+        if shards:
+            shards.stop()
+    print(f"Total products crawled: {crawler.products_found}")
+    print(f"Fetch summary: {get_fetcher().report()}")
+
+    selector_stats = get_selector_stats()
+    selector_stats.save()
+    selector_stats.print_report()
+    get_memory_profiler().print_report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Yield-aware scheduling of the per-run request budget across scrape sources.
+
+Each source's history (requests spent, new ASINs found, prices changed) is
+kept in the `crawl_stats` collection of the product store with exponential
+decay, so recent runs count more than old ones. Every run splits its request
+budget between sources in proportion to their UCB1 score: the decayed yield
+per request plus an exploration bonus for sources that have been chosen
+rarely, so a source that went quiet still gets re-checked now and then.
+
+    scheduler = CrawlScheduler(request_budget=120, time_budget=900)
+    products = scheduler.run()
+"""
+import math
+import random
+import time
+from datetime import datetime
+
+from amazon_affiliate_scraper import (
+    SOURCES,
+    get_db,
+    get_fetcher,
+    get_memory_profiler,
+    polite_delay,
+    requests_made,
+    save_many_to_firestore,
+    scrape_amazon_page,
+    scrape_deals_page,
+)
+
+STATS_COLLECTION = 'crawl_stats'
+
+def default_sources(listing_first=True):
+    """Scrape functions for every source, each taking its request allowance"""
+    sources = {
+        source_name: (lambda max_requests, url=url, source_name=source_name:
+                      scrape_amazon_page(url, source_name, listing_first=listing_first, max_products=None,
+                                         max_requests=max_requests, save=False))
+        for source_name, url in SOURCES.items()
+    }
+    sources['amazon_deals'] = lambda max_requests: scrape_deals_page(max_requests=max_requests, save=False)
+    return sources
+
+class CrawlScheduler:
+    """Split a request/time budget between sources by their historical yield"""
+
+    def __init__(self, sources=None, request_budget=100, time_budget=None, decay=0.7,
+                 exploration=1.0, min_requests=1, db=None):
+        self.sources = sources or default_sources()
+        self.request_budget = request_budget
+        self.time_budget = time_budget
+        # Weight kept by past runs each time a source runs again
+        self.decay = decay
+        self.exploration = exploration
+        # Every source gets at least this many requests (its listing page)
+        self.min_requests = min_requests
+        self.db = db if db is not None else get_db()
+        self.stats = self.load_stats()
+
+    def load_stats(self):
+        stats = {name: {'requests': 0.0, 'yield': 0.0, 'runs': 0} for name in self.sources}
+        if not self.db:
+            return stats
+        try:
+            for doc in self.db.collection(STATS_COLLECTION).stream():
+                if doc.id in stats:
+                    stats[doc.id].update(doc.to_dict())
+        except Exception as e:
+            print(f"Error loading crawl stats: {str(e)}")
+        return stats
+
+    def save_stats(self):
+        if not self.db:
+            return
+        try:
+            batch = self.db.batch()
+            for name, source_stats in self.stats.items():
+                batch.set(self.db.collection(STATS_COLLECTION).document(name), source_stats)
+            batch.commit()
+        except Exception as e:
+            print(f"Error saving crawl stats: {str(e)}")
+
+    def score(self, name):
+        """UCB1 score: fresh items per request plus an exploration bonus"""
+        source_stats = self.stats[name]
+        if not source_stats['runs'] or not source_stats['requests']:
+            return float('inf')
+        total_runs = sum(s['runs'] for s in self.stats.values())
+        rate = source_stats['yield'] / source_stats['requests']
+        bonus = self.exploration * math.sqrt(2 * math.log(max(total_runs, 1)) / source_stats['runs'])
+        return rate + bonus
+
+    def allocate(self):
+        """Return {source: request allowance} for this run, best source first.
+
+        When the budget can't give every source min_requests, only the highest
+        scoring sources run; the others' exploration bonus grows until they do.
+        """
+        names = list(self.sources)
+        random.shuffle(names)  # break ties between unseen sources fairly
+        scores = {name: self.score(name) for name in names}
+        names.sort(key=lambda name: scores[name], reverse=True)
+        if self.min_requests:
+            names = names[:self.request_budget // self.min_requests]
+
+        allocation = {name: self.min_requests for name in names}
+        spare = max(self.request_budget - self.min_requests * len(names), 0)
+        if not spare:
+            return allocation
+
+        # Unseen sources (infinite score) share the spare budget with the best
+        # known source until they have history of their own
+        finite = [scores[name] for name in names if math.isfinite(scores[name])]
+        ceiling = max(finite) if finite else 1.0
+        weights = {name: scores[name] if math.isfinite(scores[name]) else ceiling for name in names}
+        total = sum(weights.values()) or len(names)
+        for name in names:
+            allocation[name] += int(spare * (weights[name] or 1.0) / total)
+        # Rounding leftovers go to the highest scoring sources
+        leftover = self.request_budget - sum(allocation.values())
+        for name in names[:max(leftover, 0)]:
+            allocation[name] += 1
+        return allocation
+
+    def freshness(self, products):
+        """Count products that are new or whose price changed since the last save"""
+        if not products or not self.db:
+            return len(products)
+        collection = self.db.collection('products')
+        try:
+            snapshots = self.db.get_all([collection.document(p['asin']) for p in products])
+            previous = {snapshot.id: snapshot.to_dict() for snapshot in snapshots if snapshot.exists}
+        except Exception as e:
+            print(f"Error reading previous product state: {str(e)}")
+            return len(products)
+        fresh = 0
+        for product in products:
+            old = previous.get(product['asin'])
+            if old is None or old.get('price') != product.get('price'):
+                fresh += 1
+        return fresh
+
+    def record(self, name, requests, fresh):
+        source_stats = self.stats[name]
+        source_stats['requests'] = source_stats['requests'] * self.decay + requests
+        source_stats['yield'] = source_stats['yield'] * self.decay + fresh
+        source_stats['runs'] += 1
+        source_stats['last_run'] = datetime.utcnow().isoformat()
+
+    def run(self):
+        """Scrape every source within its allowance; returns all products found.
+
+        With a time budget, each source also gets a share of it in proportion
+        to its request allowance, and its fetches stop when that runs out.
+        """
+        allocation = self.allocate()
+        deadline = time.monotonic() + self.time_budget if self.time_budget else None
+        all_products = []
+        seen = set()
+        fetcher = get_fetcher()
+        run_deadline = fetcher.deadline
+        allowance_left = sum(allocation.values())
+
+        for name, allowance in allocation.items():
+            share = allowance / allowance_left if allowance_left else 0
+            allowance_left -= allowance
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"Time budget spent, skipping {name}")
+                continue
+            print(f"\nScraping {name} (score {self.score(name):.2f}, {allowance} requests)...")
+            if deadline is not None:
+                # The source's share of the time left, in proportion to its allowance;
+                # time an earlier source didn't use carries over to the rest
+                source_deadline = time.monotonic() + (deadline - time.monotonic()) * share
+                fetcher.deadline = min(source_deadline, run_deadline) if run_deadline else source_deadline
+            before = requests_made()
+            try:
+                with get_memory_profiler().stage(name):
+                    products = [p for p in self.sources[name](allowance) or [] if p.get('asin') not in seen]
+            finally:
+                fetcher.deadline = run_deadline
+            spent = requests_made() - before
+            for product in products:
+                product['source'] = name
+                seen.add(product['asin'])
+
+            fresh = self.freshness(products)
+            save_many_to_firestore(products)
+            self.record(name, spent, fresh)
+            all_products.extend(products)
+            print(f"Found {len(products)} products from {name} ({fresh} new or repriced, {spent} requests)")
+            polite_delay(2, 3)  # Delay between different sources
+
+        self.save_stats()
+        return all_products
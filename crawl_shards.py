@@ -0,0 +1,338 @@
+"""Lease-based sharding of a crawl across several workers.
+
+Keys (category URLs, ASINs) are mapped onto a fixed number of shards with a
+consistent-hash ring. Workers claim shards through lease documents in the
+`crawl_leases` collection of the product store. A lease has an owner and an
+expiry, and a background heartbeat renews it. A worker that dies stops
+renewing, its leases expire and the other workers take the shards over.
+Each worker aims for its fair share of the shards (shard count divided by
+live workers, from the `crawl_workers` heartbeats), so a worker that joins
+late gets shards handed over and every worker adds capacity.
+
+Category links a worker discovers for shards it doesn't hold go into a
+shared `crawl_frontier` collection, where the shard's owner (or whoever
+takes the shard over) picks them up. Entries still pending when a run ends
+are picked up by the owners of their shards in the next run. Products are
+written at most once per run: a product already written under the same
+CRAWL_RUN_ID by another worker is skipped.
+
+Every lease carries a fencing token that goes up when the shard changes
+owner. Before writing products or frontier entries a worker reads its
+leases back, and drops the writes for shards whose token has moved on: a
+worker that stalled past its lease can't overwrite the new owner's work.
+cleanup() deletes finished frontier entries and leases and worker
+heartbeats of past runs.
+
+    python category_crawler.py --shards 16 --budget 500
+"""
+import bisect
+import hashlib
+import math
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+LEASE_COLLECTION = 'crawl_leases'
+WORKER_COLLECTION = 'crawl_workers'
+FRONTIER_COLLECTION = 'crawl_frontier'
+# Finished frontier entries and leases are kept this long (no run lasts longer), pending entries no run reached
+# for FRONTIER_MAX_AGE are dropped
+DONE_MAX_AGE = 24 * 3600
+FRONTIER_MAX_AGE = 30 * 24 * 3600
+# Frontier entries are stamped with the publishing worker's clock; incremental reads overlap by this much
+CLOCK_SKEW = 30
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+def run_id():
+    """Identifier shared by every worker of one crawl (all jobs of a workflow run)"""
+    return os.getenv('CRAWL_RUN_ID') or os.getenv('GITHUB_RUN_ID') or datetime.utcnow().strftime('%Y%m%d')
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class HashRing:
+    """Consistent hashing of keys onto shards, with virtual nodes for an even spread"""
+
+    def __init__(self, shard_count, replicas=64):
+        self.shard_count = shard_count
+        points = sorted((_hash(f"shard-{shard}-{replica}"), shard)
+                        for shard in range(shard_count) for replica in range(replicas))
+        self._positions = [position for position, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        index = bisect.bisect(self._positions, _hash(key)) % len(self._positions)
+        return self._shards[index]
+
+class ShardLeases:
+    """Claims, renews and hands over shard leases for one worker"""
+
+    def __init__(self, db, shard_count=16, worker_id=None, lease_seconds=90, run=None):
+        self.db = db
+        self.ring = HashRing(shard_count)
+        self.shard_count = shard_count
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.run = run or run_id()
+        self.held = {}  # shard -> lease token
+        self._synced = {}  # shard -> lease token when its frontier entries were last read in full
+        self._synced_epoch = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _lease_ref(self, shard):
+        return self.db.collection(LEASE_COLLECTION).document(f"{self.run}-{shard:03d}")
+
+    def _claimable(self, lease, now):
+        return (not lease or lease.get('owner') == self.worker_id
+                or lease.get('expires_epoch', 0) <= now)
+
+    def _claim(self, shard):
+        """Take the lease on shard if it is free, expired or already ours; returns success"""
+        ref = self._lease_ref(shard)
+        now = time.time()
+
+        def new_lease(lease):
+            token = (lease or {}).get('token', 0)
+            if (lease or {}).get('owner') != self.worker_id:
+                token += 1  # fencing token: bumped on every change of owner
+            return {'shard': shard, 'run': self.run, 'owner': self.worker_id, 'token': token,
+                    'heartbeat_epoch': now, 'expires_epoch': now + self.lease_seconds}
+
+        if hasattr(self.db, 'transaction'):
+            # Firestore: read and write the lease atomically
+            from google.cloud import firestore
+
+            @firestore.transactional
+            def claim(transaction):
+                lease = ref.get(transaction=transaction).to_dict()
+                if not self._claimable(lease, now):
+                    return None
+                data = new_lease(lease)
+                transaction.set(ref, data)
+                return data
+
+            data = claim(self.db.transaction())
+        else:
+            lease = ref.get().to_dict()
+            data = new_lease(lease) if self._claimable(lease, now) else None
+            if data:
+                ref.set(data)
+                # Local stores have no transactions: confirm nobody overwrote the claim
+                if (ref.get().to_dict() or {}).get('owner') != self.worker_id:
+                    data = None
+
+        with self._lock:
+            if data:
+                self.held[shard] = data['token']
+            else:
+                self.held.pop(shard, None)
+        return data is not None
+
+    def _lost(self, shards):
+        with self._lock:
+            for shard in shards:
+                if self.held.pop(shard, None) is not None:
+                    print(f"Lost the lease on shard {shard}")
+
+    def fence(self, items, key):
+        """The items this worker may still write: drops those in shards whose lease has a newer token.
+
+        A worker that stalls past its lease still believes it holds the shard
+        until its next heartbeat, while the new owner works on it. Reading the
+        leases back right before the write catches that. Shards the worker
+        doesn't hold aren't checked.
+        """
+        items = list(items)
+        with self._lock:
+            held = dict(self.held)
+        refs = {self._lease_ref(shard).id: shard
+                for shard in {self.shard_for(key(item)) for item in items} if shard in held}
+        if not refs:
+            return items
+        lost = set()
+        for snapshot in self.db.get_all([self._lease_ref(shard) for shard in refs.values()]):
+            shard = refs[snapshot.id]
+            lease = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            if lease.get('owner') != self.worker_id or lease.get('token') != held[shard]:
+                lost.add(shard)
+        if not lost:
+            return items
+        self._lost(lost)
+        return [item for item in items if self.shard_for(key(item)) not in lost]
+
+    def _release(self, shard):
+        with self._lock:
+            self.held.pop(shard, None)
+        ref = self._lease_ref(shard)
+        if (ref.get().to_dict() or {}).get('owner') == self.worker_id:
+            ref.update({'owner': None, 'expires_epoch': 0})
+
+    def live_workers(self):
+        now = time.time()
+        workers = self.db.collection(WORKER_COLLECTION).where('run', '==', self.run).stream()
+        return max(sum(1 for doc in workers if (doc.to_dict() or {}).get('expires_epoch', 0) > now), 1)
+
+    def fair_share(self):
+        return math.ceil(self.shard_count / self.live_workers())
+
+    def heartbeat(self):
+        """Renew held leases, then claim or release shards to move toward the fair share"""
+        now = time.time()
+        self.db.collection(WORKER_COLLECTION).document(self.worker_id).set({
+            'run': self.run, 'heartbeat_epoch': now, 'expires_epoch': now + self.lease_seconds,
+            'shards': sorted(self.held),
+        })
+        for shard in list(self.held):
+            if not self._claim(shard):
+                print(f"Lost the lease on shard {shard}")
+
+        target = self.fair_share()
+        if len(self.held) > target:
+            for shard in sorted(self.held)[target:]:
+                self._release(shard)
+        else:
+            candidates = [shard for shard in range(self.shard_count) if shard not in self.held]
+            random.shuffle(candidates)  # spread concurrent claimers over different shards
+            for shard in candidates:
+                if len(self.held) >= target:
+                    break
+                self._claim(shard)
+
+    def start(self):
+        """Register, take a first share of the shards and keep the leases alive in the background"""
+        self.heartbeat()
+        print(f"Worker {self.worker_id} holds shards {sorted(self.held)} of {self.shard_count}")
+        self._thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"Error renewing shard leases: {str(e)}")
+
+    def stop(self):
+        """Stop heart-beating and hand every held shard back"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        for shard in list(self.held):
+            self._release(shard)
+        self.db.collection(WORKER_COLLECTION).document(self.worker_id).set({'expires_epoch': 0}, merge=True)
+
+    def shard_for(self, key):
+        return self.ring.shard_for(key)
+
+    def owns(self, key):
+        with self._lock:
+            return self.ring.shard_for(key) in self.held
+
+    def held_shards(self):
+        with self._lock:
+            return sorted(self.held)
+
+    def _frontier_ref(self, url):
+        # One entry per URL across runs, so a run can pick up what the last one left pending
+        doc_id = hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+        return self.db.collection(FRONTIER_COLLECTION).document(doc_id)
+
+    def publish(self, entries):
+        """Add discovered work ({'url', 'key', 'source', 'depth', 'priority', 'found_on'}) to the shared frontier.
+
+        A URL is added once per run: entries already pending, or done in this
+        run, are left alone, and entries done in an earlier run are queued again.
+        """
+        refs = {}
+        for entry in self.fence(entries, lambda entry: entry.get('found_on') or entry['key']):
+            ref = self._frontier_ref(entry['url'])
+            refs.setdefault(ref.id, (ref, entry))
+        if not refs:
+            return
+        stored = {snapshot.id: snapshot.to_dict() or {}
+                  for snapshot in self.db.get_all([ref for ref, _ in refs.values()]) if snapshot.exists}
+        now = time.time()
+        batch = self.db.batch()
+        for doc_id, (ref, entry) in refs.items():
+            shard = self.shard_for(entry['key'])
+            current = stored.get(doc_id)
+            if current and (current.get('run') == self.run
+                            or (current.get('status') == 'pending' and current.get('shard') == shard)):
+                continue
+            batch.set(ref, dict(entry, run=self.run, shard=shard, status='pending', updated_epoch=now))
+        batch.commit()
+
+    def pending(self):
+        """Frontier entries still to crawl in the shards this worker holds, including earlier runs' leftovers.
+
+        A shard's pending entries are read in full when this worker takes it
+        over; after that only entries published since the previous read.
+        """
+        with self._lock:
+            held = dict(self.held)
+        if not held:
+            return []
+        now = time.time()
+        frontier = self.db.collection(FRONTIER_COLLECTION).where('status', '==', 'pending')
+        taken = sorted(shard for shard, token in held.items() if self._synced.get(shard) != token)
+        known = sorted(shard for shard in held if shard not in taken)
+        entries = []
+        if taken:
+            entries.extend(doc.to_dict() for doc in frontier.where('shard', 'in', taken).stream())
+        if known:
+            query = (frontier.where('shard', 'in', known)
+                     .where('updated_epoch', '>', self._synced_epoch - CLOCK_SKEW))
+            entries.extend(doc.to_dict() for doc in query.stream())
+        self._synced = held
+        self._synced_epoch = now
+        return entries
+
+    def mark_done(self, entries):
+        """Mark crawled frontier entries ({'url', 'key'}) done"""
+        now = time.time()
+        batch = self.db.batch()
+        for entry in self.fence(entries, lambda entry: entry['key']):
+            batch.set(self._frontier_ref(entry['url']),
+                      {'status': 'done', 'run': self.run, 'worker': self.worker_id, 'updated_epoch': now}, merge=True)
+        batch.commit()
+
+    def cleanup(self):
+        """Delete leases and worker heartbeats of past runs, finished frontier entries of past runs
+        and pending ones no run has reached in FRONTIER_MAX_AGE; returns the number deleted"""
+        now = time.time()
+        stale = []
+        for collection in (LEASE_COLLECTION, WORKER_COLLECTION):
+            query = self.db.collection(collection).where('heartbeat_epoch', '<', now - DONE_MAX_AGE)
+            stale.extend(doc.reference for doc in query.stream())
+        frontier = self.db.collection(FRONTIER_COLLECTION)
+        for status, max_age in (('done', DONE_MAX_AGE), ('pending', FRONTIER_MAX_AGE)):
+            query = frontier.where('status', '==', status).where('updated_epoch', '<', now - max_age)
+            stale.extend(doc.reference for doc in query.stream())
+        for start in range(0, len(stale), 400):
+            batch = self.db.batch()
+            for ref in stale[start:start + 400]:
+                batch.delete(ref)
+            batch.commit()
+        return len(stale)
+
+    def unwritten(self, products):
+        """Drop products another worker already wrote in this run, and tag the rest with it"""
+        products = self.fence(products, lambda product: product.get('category') or product['asin'])
+        if not products:
+            return []
+        collection = self.db.collection('products')
+        written = {snapshot.id for snapshot in self.db.get_all([collection.document(p['asin']) for p in products])
+                   if snapshot.exists and (snapshot.to_dict() or {}).get('crawl_run') == self.run}
+        fresh = [product for product in products if product['asin'] not in written]
+        for product in fresh:
+            product['crawl_run'] = self.run
+        return fresh
@@ -0,0 +1,213 @@
+"""Export the products collection to compressed JSONL and Parquet snapshots.
+
+The collection is split into query partitions (document-id ranges), and each
+partition is streamed by its own worker into its own part files. Memory use
+stays flat however large the collection gets. Parts are written into a
+hidden temporary directory that is renamed into place only once every part
+and the manifest are complete, so readers never see a half-written snapshot.
+
+    python export_products.py --out exports --partitions 8 --format jsonl parquet
+
+Produces exports/products-<UTC timestamp>/part-00000.jsonl.zst,
+part-00000.parquet, ... and _manifest.json. Needs the zstandard and pyarrow
+packages.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from product_fields import price_to_cents, rank_field, to_count
+from product_store import open_store
+
+# Typed Parquet columns; every document is also kept whole in the `document` column
+PARQUET_COLUMNS = [
+    ('asin', 'string'),
+    ('title', 'string'),
+    ('price', 'string'),
+    ('price_cents', 'int64'),
+    ('rating', 'float64'),
+    ('review_count', 'int64'),
+    ('discount_pct', 'int64'),
+    ('source_rank', 'int64'),
+    ('image', 'string'),
+    ('image_url', 'string'),
+    ('image_uploaded', 'bool'),
+    ('source', 'string'),
+    ('category', 'string'),
+    ('timestamp', 'timestamp'),
+    ('last_updated', 'timestamp'),
+    ('document', 'string'),
+]
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(',', '')) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+def to_row(doc_id, data):
+    """Flatten a product document into the typed Parquet columns.
+
+    The two scrapers store rating/review_count as numbers or strings ("4.5", "1,234", "N/A"),
+    so those are coerced and unparseable values become nulls.
+    """
+    return {
+        'asin': data.get('asin') or doc_id,
+        'title': data.get('title'),
+        'price': None if data.get('price') is None else str(data.get('price')),
+        'price_cents': data.get('price_cents') if isinstance(data.get('price_cents'), int)
+        else price_to_cents(data.get('price')),
+        'rating': _to_float(data.get('rating')),
+        'review_count': to_count(data.get('review_count')),
+        'discount_pct': to_count(data.get('discount_pct')),
+        # Rank on the list of the source the product was last saved from
+        'source_rank': to_count(data.get(rank_field(data.get('source')))) if data.get('source') else None,
+        'image': data.get('image'),
+        'image_url': data.get('image_url'),
+        'image_uploaded': data.get('image_uploaded') if isinstance(data.get('image_uploaded'), bool) else None,
+        'source': data.get('source'),
+        'category': data.get('category'),
+        'timestamp': _to_datetime(data.get('timestamp')),
+        'last_updated': _to_datetime(data.get('last_updated')),
+        'document': json.dumps(data, default=_json_default, ensure_ascii=False),
+    }
+
+class JSONLPartWriter:
+    def __init__(self, path, level=3):
+        import zstandard
+
+        self._file = open(path, 'wb')
+        self._writer = zstandard.ZstdCompressor(level=level).stream_writer(self._file)
+
+    def write(self, doc_id, data):
+        record = dict(data, _id=doc_id)
+        self._writer.write((json.dumps(record, default=_json_default, ensure_ascii=False) + '\n').encode('utf-8'))
+
+    def close(self):
+        self._writer.close()  # also closes the underlying file
+
+class ParquetPartWriter:
+    """Buffers rows up to row_group_size and writes them as one Parquet row group"""
+
+    def __init__(self, path, row_group_size=5000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            'string': pa.string(),
+            'int64': pa.int64(),
+            'float64': pa.float64(),
+            'bool': pa.bool_(),
+            'timestamp': pa.timestamp('us', tz='UTC'),
+        }
+        self._pa = pa
+        self.schema = pa.schema([(name, types[kind]) for name, kind in PARQUET_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        self.row_group_size = row_group_size
+        self._rows = []
+
+    def write(self, doc_id, data):
+        self._rows.append(to_row(doc_id, data))
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+WRITERS = {
+    'jsonl': ('jsonl.zst', JSONLPartWriter),
+    'parquet': ('parquet', ParquetPartWriter),
+}
+
+def export_partition(index, partition, tmp_dir, formats):
+    """Stream one partition into its part files; returns the number of documents written"""
+    writers = [writer_class(os.path.join(tmp_dir, f"part-{index:05d}.{extension}"))
+               for extension, writer_class in (WRITERS[fmt] for fmt in formats)]
+    count = 0
+    try:
+        for doc in partition.query().stream():
+            data = doc.to_dict() or {}
+            for writer in writers:
+                writer.write(doc.id, data)
+            count += 1
+    finally:
+        for writer in writers:
+            writer.close()
+    return count
+
+def export_products(db, out_dir='exports', partitions=8, formats=('jsonl', 'parquet'), collection='products'):
+    """Write a snapshot of the collection and return its final directory"""
+    started = time.time()
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    final_dir = os.path.join(out_dir, f"{collection}-{stamp}")
+    tmp_dir = os.path.join(out_dir, f".{collection}-{stamp}.tmp")
+    os.makedirs(tmp_dir)
+
+    try:
+        query_partitions = list(db.collection_group(collection).get_partitions(partitions))
+        with ThreadPoolExecutor(max_workers=max(len(query_partitions), 1)) as executor:
+            counts = list(executor.map(
+                lambda item: export_partition(item[0], item[1], tmp_dir, formats),
+                enumerate(query_partitions)
+            ))
+
+        manifest = {
+            'collection': collection,
+            'exported_at': stamp,
+            'documents': sum(counts),
+            'partitions': [{'part': i, 'documents': count} for i, count in enumerate(counts)],
+            'formats': list(formats),
+            'seconds': round(time.time() - started, 2),
+        }
+        with open(os.path.join(tmp_dir, '_manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        # Atomic publish: the snapshot appears complete or not at all
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    print(f"✅ Exported {manifest['documents']} documents in {len(counts)} partitions "
+          f"to {final_dir} ({manifest['seconds']}s)")
+    return final_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the products collection to compressed snapshots")
+    parser.add_argument('--out', default='exports', help="directory to write snapshots into")
+    parser.add_argument('--partitions', type=int, default=8, help="parallel query partitions")
+    parser.add_argument('--format', nargs='+', default=['jsonl', 'parquet'], choices=sorted(WRITERS),
+                        help="snapshot formats to write")
+    parser.add_argument('--collection', default='products')
+    args = parser.parse_args()
+
+    export_products(open_store(), out_dir=args.out, partitions=args.partitions,
+                    formats=args.format, collection=args.collection)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Record and replay every page fetch as a compressed, indexed WARC-style archive.
+
+Record mode wraps the HTTP session so every request and response the
+scrapers make is appended to `<archive>` as gzip-compressed WARC records, one
+gzip member per record. An index of response offsets and timings goes to
+`<archive>.idx`. Replay mode serves a whole run from that archive with no
+network, either instantly or with the original response times scaled by
+FETCH_REPLAY_SPEED. That makes a production run reproducible as an offline
+load test or a parser regression check. Hedged duplicates of a request (see
+hedged_fetch.py) are archived but tagged, and replay skips them, so each
+fetch replays exactly one capture.
+
+    FETCH_ARCHIVE_MODE=record FETCH_ARCHIVE=runs/2026-10-19.warc.gz python amazon_affiliate_scraper.py
+    FETCH_ARCHIVE_MODE=replay FETCH_ARCHIVE=runs/2026-10-19.warc.gz FETCH_REPLAY_SPEED=0 python amazon_affiliate_scraper.py
+    python fetch_archive.py runs/2026-10-19.warc.gz
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+def _warc_record(record_type, uri, payload, extra_headers=None):
+    headers = [
+        'WARC/1.1',
+        f'WARC-Type: {record_type}',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f'WARC-Date: {datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}',
+        f'WARC-Target-URI: {uri}',
+    ]
+    headers.extend(f'{name}: {value}' for name, value in (extra_headers or {}).items())
+    headers.append(f'Content-Length: {len(payload)}')
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('utf-8') + payload + b'\r\n\r\n'
+
+def _http_headers(start_line, headers):
+    lines = [start_line] + [f'{name}: {value}' for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8', 'replace')
+
+class ArchiveWriter:
+    """Appends request/response records to a WARC-style archive and its index"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'ab')
+        self._index = open(path + '.idx', 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def _append(self, record):
+        member = gzip.compress(record)
+        offset = self._file.tell()
+        self._file.write(member)
+        return offset, len(member)
+
+    def record(self, url, request_headers, started, elapsed, response=None, error=None, hedge=False):
+        request = _warc_record('request', url, _http_headers(f'GET {url} HTTP/1.1', request_headers),
+                               {'Content-Type': 'application/http;msgtype=request'})
+        entry = {'uri': url, 'started': round(started - self._started, 4), 'elapsed': round(elapsed, 4)}
+        if hedge:
+            entry['hedge'] = True
+        if response is not None:
+            payload = _http_headers(f'HTTP/1.1 {response.status_code} {response.reason or ""}',
+                                    {k: v for k, v in response.headers.items()
+                                     if k.lower() not in ('content-encoding', 'transfer-encoding', 'content-length')})
+            payload += response.content
+            record = _warc_record('response', url, payload, {'Content-Type': 'application/http;msgtype=response'})
+            entry['status'] = response.status_code
+        else:
+            record = _warc_record('metadata', url, str(error).encode('utf-8'),
+                                  {'Content-Type': 'text/plain', 'WARC-Concurrent-To': 'fetch-error'})
+            entry['error'] = f'{type(error).__name__}: {error}'
+
+        with self._lock:
+            self._append(request)
+            entry['offset'], entry['length'] = self._append(record)
+            self._file.flush()
+            self._index.write(json.dumps(entry) + '\n')
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._index.close()
+
+class RecordingSession:
+    """requests.Session stand-in that archives every GET it makes"""
+
+    # HedgedFetcher passes hedge=True for duplicate requests to sessions that set this
+    hedge_aware = True
+
+    def __init__(self, session, writer):
+        self.session = session
+        self.writer = writer
+
+    def get(self, url, headers=None, timeout=None, hedge=False, **kwargs):
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            self.writer.record(url, headers or {}, started, time.monotonic() - started, error=e, hedge=hedge)
+            raise
+        self.writer.record(url, headers or {}, started, time.monotonic() - started, response=response, hedge=hedge)
+        return response
+
+class ReplayResponse:
+    """The parts of requests.Response the scrapers use, rebuilt from an archive record"""
+
+    def __init__(self, url, status_code, reason, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = 'utf-8'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, 'replace')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} {self.reason} for url: {self.url}", response=self)
+
+class ArchiveReader:
+    """Serves responses for URLs from an archive, in the order they were captured"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = defaultdict(deque)
+        self.hedges = 0
+        with open(path + '.idx', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get('hedge'):
+                        # The primary request's capture stands for the fetch
+                        self.hedges += 1
+                        continue
+                    self.entries[entry['uri']].append(entry)
+        self._served = {}  # url -> the capture last served for it
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def next_entry(self, url, consume=True):
+        """Next capture of url; the last one repeats once a URL's captures run out.
+
+        consume=False returns the capture last served for url instead, for hedges
+        that duplicate a fetch already in progress.
+        """
+        with self._lock:
+            if not consume and url in self._served:
+                return self._served[url]
+            entries = self.entries.get(url)
+            if not entries:
+                return None
+            entry = entries.popleft() if consume and len(entries) > 1 else entries[0]
+            self._served[url] = entry
+            return entry
+
+    def read_record(self, entry):
+        with self._lock:
+            self._file.seek(entry['offset'])
+            member = self._file.read(entry['length'])
+        record = gzip.decompress(member)
+        _, _, block = record.partition(b'\r\n\r\n')
+        return block[:-4] if block.endswith(b'\r\n\r\n') else block
+
+    def response(self, entry):
+        block = self.read_record(entry)
+        head, _, body = block.partition(b'\r\n\r\n')
+        lines = head.decode('utf-8', 'replace').split('\r\n')
+        _, status, reason = (lines[0].split(' ', 2) + [''])[:3]
+        headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+        return ReplayResponse(entry['uri'], int(status), reason, headers, body)
+
+class ReplaySession:
+    """requests.Session stand-in that answers from an archive instead of the network"""
+
+    hedge_aware = True
+
+    def __init__(self, reader, speed=0.0):
+        self.reader = reader
+        # 1.0 replays original response times, 0 serves everything instantly
+        self.speed = speed
+
+    def get(self, url, headers=None, timeout=None, hedge=False, **kwargs):
+        # A hedge replays the same capture as the fetch it duplicates
+        entry = self.reader.next_entry(url, consume=not hedge)
+        if entry is None:
+            raise requests.ConnectionError(f"{url} is not in the archive {self.reader.path}")
+        delay = entry.get('elapsed', 0) * self.speed
+        if delay:
+            if timeout is not None and delay > timeout:
+                time.sleep(timeout)
+                raise requests.Timeout(f"Replayed response for {url} took {delay:.1f}s")
+            time.sleep(delay)
+        if 'error' in entry:
+            raise requests.ConnectionError(f"Replayed failure for {url}: {entry['error']}")
+        return self.reader.response(entry)
+
+def archive_mode():
+    """'record', 'replay' or None, from FETCH_ARCHIVE_MODE"""
+    mode = (os.getenv('FETCH_ARCHIVE_MODE') or '').lower() or None
+    if mode not in (None, 'record', 'replay'):
+        raise ValueError(f"FETCH_ARCHIVE_MODE must be 'record' or 'replay', not {mode}")
+    return mode
+
+def replay_speed():
+    return float(os.getenv('FETCH_REPLAY_SPEED', '0'))
+
+def wrap_session(session):
+    """Wrap a requests.Session for record/replay according to FETCH_ARCHIVE_MODE"""
+    mode = archive_mode()
+    if mode is None:
+        return session
+    path = os.getenv('FETCH_ARCHIVE') or f"archives/{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.warc.gz"
+    if mode == 'record':
+        print(f"📼 Recording fetches to {path}")
+        return RecordingSession(session, ArchiveWriter(path))
+    reader = ArchiveReader(path)
+    print(f"📼 Replaying {len(reader)} captured responses from {path}")
+    return ReplaySession(reader, replay_speed())
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python fetch_archive.py <archive.warc.gz>")
+        sys.exit(1)
+    reader = ArchiveReader(sys.argv[1])
+    statuses = defaultdict(int)
+    elapsed = []
+    for entries in reader.entries.values():
+        for entry in entries:
+            statuses[entry.get('status', 'error')] += 1
+            elapsed.append(entry['elapsed'])
+    print(f"{len(reader)} captures of {len(reader.entries)} URLs ({reader.hedges} hedged duplicates skipped)")
+    for status, count in sorted(statuses.items(), key=str):
+        print(f"  {status}: {count}")
+    if elapsed:
+        elapsed.sort()
+        print(f"  latency p50 {elapsed[len(elapsed) // 2]:.2f}s, "
+              f"p95 {elapsed[min(int(len(elapsed) * 0.95), len(elapsed) - 1)]:.2f}s, max {elapsed[-1]:.2f}s")
+
+if __name__ == "__main__":
+    main()
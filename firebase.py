@@ -1,5 +1,4 @@
 import os
-from google.cloud import firestore
 from dotenv import load_dotenv
 
 def init_firestore():
@@ -18,7 +17,8 @@ def init_firestore():
     if missing_vars:
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
     
-    # Initialize Firestore client
+    # Initialize Firestore client (imported here; google.cloud is slow to import)
+    from google.cloud import firestore
     try:
         db = firestore.Client(project=os.getenv('FIREBASE_PROJECT_ID'))
         return db
@@ -0,0 +1,204 @@
+"""Deadline-bounded, hedged page fetching with per-endpoint circuit breakers.
+
+A sequential scrape is only as fast as its slowest response. HedgedFetcher
+bounds that in three ways:
+
+* every request's timeout is capped by what is left of the run's deadline;
+* if the first attempt hasn't answered after the endpoint's observed p95
+  latency, an identical hedge request is sent and whichever good response
+  arrives first wins;
+* an endpoint that keeps failing trips a circuit breaker and is skipped for
+  a cool-down period instead of being retried into the ground.
+
+Failures are raised as requests.RequestException subclasses, so existing
+`except requests.RequestException` handlers keep working.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import requests
+
+class DeadlineExceeded(requests.RequestException):
+    """The run's latency budget is spent"""
+
+class CircuitOpen(requests.RequestException):
+    """The endpoint failed too often recently and is being skipped"""
+
+def endpoint_key(url):
+    """Group URLs whose latency and health behave alike (all detail pages share one key)"""
+    parsed = urlparse(url)
+    if '/dp/' in parsed.path:
+        return f"{parsed.netloc}/dp"
+    return f"{parsed.netloc}{parsed.path.split('/ref=')[0].rstrip('/')}"
+
+class LatencyTracker:
+    """Rolling window of response times for one endpoint"""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+        return ordered[index]
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial request through after the cool-down"""
+
+    def __init__(self, failure_threshold=5, cooldown=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # Half-open: one trial request; a failure re-opens immediately
+            self.opened_at = None
+            self.failures = self.failure_threshold - 1
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class HedgedFetcher:
+    def __init__(self, session_factory, headers_factory, max_timeout=10, min_hedge_delay=0.5,
+                 default_hedge_delay=2.0, min_samples=20, max_workers=8,
+                 failure_threshold=5, cooldown=60):
+        self.session_factory = session_factory
+        self.headers_factory = headers_factory
+        self.max_timeout = max_timeout
+        self.min_hedge_delay = min_hedge_delay
+        # Used until an endpoint has min_samples latencies to take a p95 from
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self.deadline = None
+        self.requests_sent = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._latency = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def set_deadline(self, seconds):
+        """Bound the rest of the run to `seconds` (None removes the bound)"""
+        self.deadline = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def hedge_delay(self, key):
+        tracker = self._latency.get(key)
+        if not tracker or len(tracker.samples) < self.min_samples:
+            return self.default_hedge_delay
+        return max(tracker.percentile(95), self.min_hedge_delay)
+
+    def _attempt(self, url, timeout, hedge=False):
+        start = time.monotonic()
+        session = self.session_factory()
+        # Archive sessions tag duplicates so a replay serves each fetch once
+        kwargs = {'hedge': True} if hedge and getattr(session, 'hedge_aware', False) else {}
+        response = session.get(url, headers=self.headers_factory(), timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response, time.monotonic() - start
+
+    def _record(self, key, elapsed=None, error=None):
+        with self._lock:
+            breaker = self._breakers.setdefault(key, CircuitBreaker(self.failure_threshold, self.cooldown))
+            if error is None:
+                self._latency.setdefault(key, LatencyTracker()).add(elapsed)
+                breaker.success()
+            elif not (isinstance(error, requests.HTTPError) and error.response is not None
+                      and error.response.status_code == 404):
+                # A missing product says nothing about the endpoint's health
+                breaker.failure()
+
+    def fetch(self, url):
+        key = endpoint_key(url)
+        with self._lock:
+            breaker = self._breakers.setdefault(key, CircuitBreaker(self.failure_threshold, self.cooldown))
+            if not breaker.allow():
+                raise CircuitOpen(f"Circuit open for {key}, skipping {url}")
+
+        timeout = self.max_timeout
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Run deadline reached before fetching {url}")
+            timeout = min(timeout, remaining)
+
+        self.requests_sent += 1
+        pending = {self._executor.submit(self._attempt, url, timeout): 'primary'}
+        now = time.monotonic()
+        hedge_at = now + self.hedge_delay(key)
+        end = now + timeout
+        hedge_sent = False
+        last_error = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            wait_until = end if hedge_sent else min(hedge_at, end)
+            done, _ = wait(list(pending), timeout=max(wait_until - now, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                kind = pending.pop(future)
+                try:
+                    response, elapsed = future.result()
+                except requests.RequestException as e:
+                    self._record(key, error=e)
+                    last_error = e
+                    continue
+                self._record(key, elapsed=elapsed)
+                if kind == 'hedge':
+                    self.hedges_won += 1
+                # A still-running attempt finishes in the background and is ignored
+                return response
+
+            if pending and not hedge_sent and time.monotonic() >= hedge_at:
+                hedge_sent = True
+                remaining = end - time.monotonic()
+                if remaining > self.min_hedge_delay:
+                    # Slower than this endpoint's p95: race a duplicate request
+                    self.requests_sent += 1
+                    self.hedges_sent += 1
+                    pending[self._executor.submit(self._attempt, url, remaining, True)] = 'hedge'
+
+        if last_error is not None and not pending:
+            raise last_error
+        error = requests.Timeout(f"No response from {url} within {timeout:.1f}s")
+        self._record(key, error=error)
+        raise error
+
+    def report(self):
+        """One-line summary of hedging and open circuits for the run log"""
+        open_circuits = [key for key, breaker in self._breakers.items() if breaker.opened_at is not None]
+        line = (f"{self.requests_sent} requests, {self.hedges_sent} hedges "
+                f"({self.hedges_won} won)")
+        if open_circuits:
+            line += f", open circuits: {', '.join(sorted(open_circuits))}"
+        return line
@@ -0,0 +1,149 @@
+"""Memory profiling hooks and the bounded-memory switch for large crawls.
+
+With MEMORY_PROFILE=1, tracemalloc runs for the whole process and the
+scrapers wrap their stages (each source, the category-page and detail-page
+phases of a crawl, daemon sweeps and refreshes) in `profiler.stage(name)`.
+Each stage records the Python heap peak, RSS at start and end, and the
+largest RSS seen, and can take tracemalloc snapshots to show which lines
+grew. print_report() adds a per-stage table and the top allocation sites
+of the run to the run log. Without MEMORY_PROFILE the hooks cost nothing.
+
+With BOUNDED_MEMORY=1 the scrapers free each parse tree as soon as a page
+is extracted, keep no page bodies around and cap the documents they hold
+in memory at once, so RSS stays flat over very long crawls.
+
+    MEMORY_PROFILE=1 BOUNDED_MEMORY=1 python category_crawler.py --budget 100000
+"""
+import contextlib
+import os
+import time
+import tracemalloc
+
+def _env_flag(name):
+    return (os.getenv(name) or '').lower() in ('1', 'true', 'yes', 'on')
+
+def bounded_memory():
+    """True when BOUNDED_MEMORY is set"""
+    return _env_flag('BOUNDED_MEMORY')
+
+def max_in_flight(default=1000):
+    """Most documents a stage may hold in memory at once in bounded-memory mode"""
+    return int(os.getenv('MAX_IN_FLIGHT_DOCS') or default)
+
+def current_rss():
+    """Resident set size of this process in bytes (None where it can't be read)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # No /proc (macOS): fall back to the peak, in bytes there
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _size(value):
+    if value is None:
+        return "n/a"
+    return f"{value / 1e6:.1f} MB" if abs(value) >= 1e6 else f"{value / 1e3:.0f} KB"
+
+# Frames from these files are profiler overhead, not the scraper's allocations
+_IGNORED_FILES = (tracemalloc.__file__, __file__, '<frozen importlib._bootstrap>',
+                  '<frozen importlib._bootstrap_external>', '<unknown>')
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES])
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.heap_peak = 0
+        self.rss_start = None
+        self.rss_end = None
+        self.rss_max = None
+        self.growth = []  # (allocation site, bytes) of the last snapshotted run
+
+    def observe_rss(self, rss):
+        if rss is not None and (self.rss_max is None or rss > self.rss_max):
+            self.rss_max = rss
+
+class MemoryProfiler:
+    """Per-stage memory accounting; every method is a no-op unless enabled"""
+
+    def __init__(self, enabled=None, frames=1, top=10):
+        self.enabled = _env_flag('MEMORY_PROFILE') if enabled is None else enabled
+        self.top = top
+        self.stages = {}
+        self._active = []
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @contextlib.contextmanager
+    def stage(self, name, snapshot=True):
+        """Account the memory used inside the with-block to stage `name`.
+
+        Repeated stages accumulate into one row. snapshot=False skips the
+        tracemalloc snapshots, for stages that run once per page.
+        """
+        if not self.enabled:
+            yield
+            return
+        stats = self.stages.setdefault(name, StageStats(name))
+        rss = current_rss()
+        if stats.rss_start is None:
+            stats.rss_start = rss
+        stats.observe_rss(rss)
+        before = _snapshot() if snapshot else None
+        outer_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        self._active.append(stats)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._active.pop()
+            stats.runs += 1
+            stats.seconds += time.monotonic() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            stats.heap_peak = max(stats.heap_peak, peak)
+            for outer in self._active:
+                outer.heap_peak = max(outer.heap_peak, peak, outer_peak)
+            stats.rss_end = current_rss()
+            stats.observe_rss(stats.rss_end)
+            if before is not None:
+                stats.growth = [(str(stat.traceback), stat.size_diff)
+                                for stat in _snapshot().compare_to(before, 'lineno')[:3] if stat.size_diff > 0]
+
+    def sample(self):
+        """Record the current RSS against every active stage (call now and then in long loops)"""
+        if not self.enabled or not self._active:
+            return
+        rss = current_rss()
+        for stats in self._active:
+            stats.observe_rss(rss)
+
+    def top_allocations(self):
+        """(site, bytes, blocks) of the largest live allocations right now"""
+        if not self.enabled:
+            return []
+        return [(str(stat.traceback), stat.size, stat.count)
+                for stat in _snapshot().statistics('lineno')[:self.top]]
+
+    def print_report(self):
+        if not self.enabled:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"\n🧠 Memory: RSS {_size(current_rss())}, Python heap {_size(current)} (peak {_size(peak)})")
+        for stats in self.stages.values():
+            print(f"  {stats.name}: {stats.runs} run(s), {stats.seconds:.1f}s, heap peak {_size(stats.heap_peak)}, "
+                  f"RSS {_size(stats.rss_start)} -> {_size(stats.rss_end)} (max {_size(stats.rss_max)})")
+            for site, size in stats.growth:
+                print(f"      +{_size(size)} {site}")
+        print("  Top allocation sites:")
+        for site, size, count in self.top_allocations():
+            print(f"    {_size(size)} in {count} blocks: {site}")
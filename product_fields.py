@@ -0,0 +1,138 @@
+"""Numeric query fields stored alongside every product.
+
+Both scrapers store `price` as a display string ("$12.99") and have written
+`rating` / `review_count` as numbers or strings ("4.5", "1,234", "N/A"), so
+the storefront could only sort by timestamp. Every write also stores these
+integer fields, which Firestore can filter, sort and paginate on:
+
+    price_cents    1299
+    rating_x10     45       (rating 4.5)
+    review_count   1234
+    discount_pct   23       (from list_price, when the page shows one)
+    rank_<source>  3        (position on that source's listing page, e.g. rank_amazon_deals)
+
+A product can turn up on more than one source, so the scrapers' `source_rank`
+is stored under the source it was seen on and one list's rank never sorts
+another list. The matching composite indexes are in amazonakiko-site/firestore.indexes.json.
+Documents written before these fields existed can be backfilled:
+
+    python product_fields.py --backfill
+"""
+import argparse
+import re
+
+def price_to_cents(price):
+    """Convert a stored price ("$12.99", "1,299.00", 12.99) to integer cents, or None"""
+    if price is None or isinstance(price, bool):
+        return None
+    if isinstance(price, (int, float)):
+        return int(round(price * 100))
+    text = re.sub(r'[^\d.,]', '', str(price))
+    if ',' in text and '.' in text:
+        text = text.replace(',', '')
+    elif ',' in text:
+        # "12,99" is a decimal comma; "1,299" is a thousands separator
+        whole, _, fraction = text.rpartition(',')
+        text = f"{whole}.{fraction}" if len(fraction) == 2 else text.replace(',', '')
+    try:
+        return int(round(float(text) * 100))
+    except ValueError:
+        return None
+
+def rating_x10(rating):
+    """4.5, "4.5" or "4.5 out of 5 stars" -> 45; None if there is no rating"""
+    if rating is None or isinstance(rating, bool):
+        return None
+    if isinstance(rating, (int, float)):
+        value = float(rating)
+    else:
+        match = re.search(r'\d+(?:[.,]\d+)?', str(rating))
+        if not match:
+            return None
+        value = float(match.group(0).replace(',', '.'))
+    return int(round(value * 10)) if 0 <= value <= 5 else None
+
+def to_count(value):
+    """1234, "1,234" or "(1,234)" -> 1234; None if there is no number"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r'[^\d]', '', str(value))
+    return int(digits) if digits else None
+
+def bare_count(text):
+    """1234 for review count text that is only a count ("1,234" or "(1,234)"), else None.
+
+    Listing cards reuse the count's classes for prices and badges, so "$12.99"
+    must not become 1299 reviews.
+    """
+    text = (text or '').strip()
+    return to_count(text) if re.fullmatch(r'\(?\d[\d,]*\)?', text) else None
+
+def discount_pct(price_cents, list_price_cents):
+    """Percent off the list price; None without both prices, so a merge keeps the stored value"""
+    if not price_cents or not list_price_cents:
+        return None
+    if list_price_cents <= price_cents:
+        return 0
+    return int(round((list_price_cents - price_cents) * 100 / list_price_cents))
+
+def rank_field(source):
+    """The field holding a product's position on the given source's list"""
+    return f"rank_{source}"
+
+def query_fields(product):
+    """The numeric query fields for a product dict (fields without a value are left out)"""
+    cents = price_to_cents(product.get('price'))
+    fields = {
+        'price_cents': cents,
+        'rating_x10': rating_x10(product.get('rating')),
+        'review_count': to_count(product.get('review_count')),
+        'discount_pct': discount_pct(cents, price_to_cents(product.get('list_price'))),
+    }
+    if product.get('source'):
+        fields[rank_field(product['source'])] = to_count(product.get('source_rank'))
+    return {key: value for key, value in fields.items() if value is not None}
+
+def with_query_fields(product):
+    """A copy of product with its numeric query fields filled in, ready to write"""
+    product = dict(product, **query_fields(product))
+    product.pop('source_rank', None)  # stored per source as rank_<source>
+    return product
+
+def backfill(db, collection='products', batch_size=400):
+    """Add the query fields to every stored product that lacks or disagrees with them"""
+    batch = db.batch()
+    pending = updated = 0
+    for doc in db.collection(collection).stream():
+        data = doc.to_dict() or {}
+        fields = query_fields(data)
+        if all(data.get(key) == value for key, value in fields.items()):
+            continue
+        batch.set(doc.reference, fields, merge=True)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            updated += pending
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+        updated += pending
+    print(f"✅ Backfilled query fields on {updated} products")
+    return updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain numeric query fields on stored products")
+    parser.add_argument('--backfill', action='store_true', help="add the fields to existing products")
+    parser.add_argument('--collection', default='products')
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from product_store import open_store
+    backfill(open_store(), collection=args.collection)
+
+if __name__ == "__main__":
+    main()
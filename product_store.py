@@ -0,0 +1,540 @@
+"""Pluggable storage backends for scraped products.
+
+Every backend returned by open_store() behaves like a Firestore client for the
+calls the scrapers make: collection().document().set()/update()/get(),
+collection().where().order_by().limit().stream(), get_all(), batch().commit()
+and collection_group().get_partitions() for parallel reads.
+That lets the same code write to Firestore in production, or to SQLite,
+a JSONL log or plain memory for local crawls, benchmarks and tests.
+
+Select a backend with the PRODUCT_STORE environment variable:
+
+    PRODUCT_STORE=firestore               (default)
+    PRODUCT_STORE=sqlite:///products.db
+    PRODUCT_STORE=jsonl:///products.jsonl
+    PRODUCT_STORE=memory
+
+As with SQLAlchemy URLs, three slashes give a path relative to the working
+directory and four an absolute one (sqlite:////var/lib/products.db).
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+DEFAULT_STORE = 'firestore'
+
+def _same_kind(a, b):
+    """Firestore only compares numbers with numbers and strings with strings"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool)
+    if isinstance(a, (int, float)):
+        return isinstance(b, (int, float))
+    return type(a) is type(b)
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: _same_kind(a, b) and a < b,
+    '<=': lambda a, b: _same_kind(a, b) and a <= b,
+    '>': lambda a, b: _same_kind(a, b) and a > b,
+    '>=': lambda a, b: _same_kind(a, b) and a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+def _json_default(value):
+    """Serialize values JSON doesn't know about (datetimes, Firestore sentinels)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _dumps(data):
+    return json.dumps(data, default=_json_default, ensure_ascii=False)
+
+def _merge(existing, data):
+    merged = dict(existing or {})
+    merged.update(data)
+    return merged
+
+def _check_updates(ops, get):
+    """Raise KeyError if an update in ops would find no document, like Firestore does"""
+    exists = {}
+    for kind, collection_name, doc_id, _, _ in ops:
+        key = (collection_name, doc_id)
+        if key not in exists:
+            exists[key] = get(collection_name, doc_id) is not None
+        if kind == 'update' and not exists[key]:
+            raise KeyError(f"No document to update: {collection_name}/{doc_id}")
+        exists[key] = kind != 'delete'
+
+class DocumentSnapshot:
+    """Read-only view of a stored document"""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+class DocumentReference:
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self.collection_name = collection_name
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self.collection_name}/{self.id}"
+
+    def get(self):
+        return DocumentSnapshot(self, self._client._get(self.collection_name, self.id))
+
+    def set(self, data, merge=False):
+        self._client._write([('set', self.collection_name, self.id, data, merge)])
+
+    def update(self, data):
+        self._client._write([('update', self.collection_name, self.id, data, True)])
+
+    def delete(self):
+        self._client._write([('delete', self.collection_name, self.id, None, False)])
+
+class Query:
+    def __init__(self, client, collection_name, filters=(), orders=(), limit_count=None, offset_count=0, cursor=None,
+                 id_range=(None, None)):
+        self._client = client
+        self.collection_name = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._offset = offset_count
+        self._cursor = cursor
+        # Document id bounds (start inclusive, end exclusive) set by query partitions
+        self._id_range = id_range
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'offset_count': self._offset,
+            'cursor': self._cursor,
+            'id_range': self._id_range,
+        }
+        state.update(changes)
+        return Query(self._client, self.collection_name, **state)
+
+    def where(self, field, op, value):
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction='ASCENDING'):
+        descending = str(direction).upper().startswith('DESC')
+        return self._copy(orders=self._orders + ((field, descending),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def offset(self, count):
+        return self._copy(offset_count=count)
+
+    def start_after(self, snapshot_or_values):
+        return self._copy(cursor=snapshot_or_values)
+
+    def stream(self):
+        docs = self._client._query(self)
+        return (DocumentSnapshot(DocumentReference(self._client, self.collection_name, doc_id), data)
+                for doc_id, data in docs)
+
+    def get(self):
+        return list(self.stream())
+
+    def _in_range(self, doc_id):
+        start, end = self._id_range
+        return (start is None or doc_id >= start) and (end is None or doc_id < end)
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if op in ('!=', 'not-in') and field not in data:
+                # Firestore leaves out documents without the field
+                return False
+            try:
+                if not _OPERATORS[op](data.get(field), value):
+                    return False
+            except TypeError:
+                return False
+        return True
+
+    def _cursor_values(self):
+        if isinstance(self._cursor, DocumentSnapshot):
+            data = self._cursor.to_dict() or {}
+            return [data.get(field) for field, _ in self._orders] + [self._cursor.id]
+        if isinstance(self._cursor, dict):
+            return [self._cursor.get(field) for field, _ in self._orders]
+        return list(self._cursor)
+
+    def _apply(self, docs):
+        """Filter, sort, page and limit (doc_id, data) pairs in Python"""
+        # Like Firestore, ordering by a field leaves out documents that don't have it
+        docs = [(doc_id, data) for doc_id, data in docs
+                if self._in_range(doc_id) and self._matches(data) and all(field in data for field, _ in self._orders)]
+        docs.sort(key=lambda item: item[0])
+        for field, descending in reversed(self._orders):
+            docs.sort(key=lambda item: _sort_key(item[1].get(field)), reverse=descending)
+        if self._cursor is not None:
+            docs = _after_cursor(docs, self._orders, self._cursor_values())
+        docs = docs[self._offset:]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return docs
+
+def _sort_key(value):
+    # Firestore orders missing/None values first and never compares across types
+    if value is None:
+        return (0, '')
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value))
+
+def _after_cursor(docs, orders, values):
+    def position(item):
+        doc_id, data = item
+        key = [_sort_key(data.get(field)) for field, _ in orders]
+        if len(values) > len(orders):
+            key.append(doc_id)
+        return key
+
+    target = [_sort_key(v) for v in values[:len(orders)]]
+    if len(values) > len(orders):
+        target.append(values[len(orders)])
+    for index, item in enumerate(docs):
+        key = position(item)
+        for (_, descending), a, b in zip(list(orders) + [('__name__', False)], key, target):
+            if a == b:
+                continue
+            if (a > b) != descending:
+                return docs[index:]
+            break
+    return []
+
+class CollectionReference(Query):
+    def __init__(self, client, collection_name):
+        super().__init__(client, collection_name)
+        self.id = collection_name
+
+    def document(self, doc_id):
+        return DocumentReference(self._client, self.collection_name, doc_id)
+
+    def add(self, data):
+        doc_id = os.urandom(10).hex()
+        ref = self.document(doc_id)
+        ref.set(data)
+        return ref
+
+class QueryPartition:
+    """A slice of a collection by document id, as returned by get_partitions()"""
+
+    def __init__(self, parent, start_at, end_at):
+        self._parent = parent
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def query(self):
+        return self._parent._copy(id_range=(self.start_at, self.end_at))
+
+class CollectionGroup(Query):
+    def get_partitions(self, partition_count):
+        """Split the collection into up to partition_count id ranges of similar size"""
+        ids = self._client._ids(self.collection_name)
+        partition_count = max(1, min(partition_count, len(ids)))
+        bounds = [None] + [ids[len(ids) * i // partition_count] for i in range(1, partition_count)] + [None]
+        for start, end in zip(bounds, bounds[1:]):
+            yield QueryPartition(self, start, end)
+
+class WriteBatch:
+    """Collects writes and applies them together on commit()"""
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def set(self, reference, data, merge=False):
+        self._ops.append(('set', reference.collection_name, reference.id, data, merge))
+
+    def update(self, reference, data):
+        # Checked on commit: a missing document fails the whole batch
+        self._ops.append(('update', reference.collection_name, reference.id, data, True))
+
+    def delete(self, reference):
+        self._ops.append(('delete', reference.collection_name, reference.id, None, False))
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        self._client._write(ops)
+        return len(ops)
+
+class MemoryStore:
+    """In-memory stand-in for a Firestore client"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
+
+    def collection_group(self, name):
+        return CollectionGroup(self, name)
+
+    def close(self):
+        pass
+
+    def _get(self, collection_name, doc_id):
+        with self._lock:
+            data = self._collections.get(collection_name, {}).get(doc_id)
+            return copy.deepcopy(data) if data is not None else None
+
+    def _apply_ops(self, ops):
+        for kind, collection_name, doc_id, data, merge in ops:
+            docs = self._collections.setdefault(collection_name, {})
+            if kind == 'delete':
+                docs.pop(doc_id, None)
+            elif merge:
+                docs[doc_id] = _merge(docs.get(doc_id), copy.deepcopy(data))
+            else:
+                docs[doc_id] = copy.deepcopy(data)
+
+    def _write(self, ops):
+        with self._lock:
+            _check_updates(ops, self._get)
+            self._apply_ops(ops)
+
+    def _ids(self, collection_name):
+        with self._lock:
+            return sorted(self._collections.get(collection_name, {}))
+
+    def _query(self, query):
+        with self._lock:
+            docs = [(doc_id, copy.deepcopy(data))
+                    for doc_id, data in self._collections.get(query.collection_name, {}).items()]
+        return query._apply(docs)
+
+class JSONLStore(MemoryStore):
+    """Append-only JSONL log, replayed into memory when opened"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    self._apply_ops([(record['op'], record['collection'], record['id'],
+                                      record.get('data'), record.get('merge', False))])
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, ops):
+        lines = []
+        for kind, collection_name, doc_id, data, merge in ops:
+            # An update is logged as the merge it becomes once checked
+            record = {'op': 'delete' if kind == 'delete' else 'set', 'collection': collection_name, 'id': doc_id}
+            if kind != 'delete':
+                record['data'] = data
+                record['merge'] = merge
+            lines.append(_dumps(record) + '\n')
+        with self._lock:
+            _check_updates(ops, self._get)
+            self._file.write(''.join(lines))
+            self._file.flush()
+            # Keep the in-memory view in its JSON form so reads match a reopen
+            self._apply_ops([(kind, coll, doc_id, json.loads(_dumps(data)) if data is not None else None, merge)
+                             for kind, coll, doc_id, data, merge in ops])
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class SQLiteStore:
+    """SQLite-backed store (WAL mode, one JSON document per row)"""
+
+    # != stays in Python: it has to match values of every other type too
+    _SQL_OPERATORS = {'==': '=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            ' collection TEXT NOT NULL,'
+            ' id TEXT NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' PRIMARY KEY (collection, id))'
+        )
+        self._conn.commit()
+
+    def collection(self, name):
+        return CollectionReference(self, name)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
+
+    def collection_group(self, name):
+        return CollectionGroup(self, name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get(self, collection_name, doc_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM documents WHERE collection = ? AND id = ?',
+                (collection_name, doc_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, ops):
+        """Apply a list of writes in one transaction"""
+        with self._lock, self._conn:
+            upserts = []
+            for kind, collection_name, doc_id, data, merge in ops:
+                if kind == 'delete':
+                    self._flush_upserts(upserts)
+                    self._conn.execute('DELETE FROM documents WHERE collection = ? AND id = ?',
+                                       (collection_name, doc_id))
+                    continue
+                if merge:
+                    # Merges read the current row, so earlier writes must land first
+                    self._flush_upserts(upserts)
+                    existing = self._get(collection_name, doc_id)
+                    if kind == 'update' and existing is None:
+                        # Raising rolls back the whole transaction
+                        raise KeyError(f"No document to update: {collection_name}/{doc_id}")
+                    data = _merge(existing, data)
+                upserts.append((collection_name, doc_id, _dumps(data)))
+            self._flush_upserts(upserts)
+
+    def _flush_upserts(self, upserts):
+        if not upserts:
+            return
+        self._conn.executemany(
+            'INSERT INTO documents (collection, id, data) VALUES (?, ?, ?) '
+            'ON CONFLICT(collection, id) DO UPDATE SET data = excluded.data',
+            upserts
+        )
+        upserts.clear()
+
+    def _ids(self, collection_name):
+        with self._lock:
+            rows = self._conn.execute('SELECT id FROM documents WHERE collection = ? ORDER BY id',
+                                      (collection_name,)).fetchall()
+        return [row[0] for row in rows]
+
+    def _query(self, query):
+        sql = 'SELECT id, data FROM documents WHERE collection = ?'
+        params = [query.collection_name]
+        start, end = query._id_range
+        if start is not None:
+            sql += ' AND id >= ?'
+            params.append(start)
+        if end is not None:
+            sql += ' AND id < ?'
+            params.append(end)
+        python_filters = []
+        for field, op, value in query._filters:
+            sql_op = self._SQL_OPERATORS.get(op)
+            if sql_op and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                # SQLite would compare text with numbers; only compare values of the same kind
+                json_types = "('text')" if isinstance(value, str) else "('integer', 'real')"
+                sql += f" AND json_type(data, ?) IN {json_types} AND json_extract(data, ?) {sql_op} ?"
+                params.extend([f'$."{field}"', f'$."{field}"', value])
+            else:
+                python_filters.append((field, op, value))
+        plain = not python_filters and not query._orders and query._cursor is None
+        if plain:
+            sql += ' ORDER BY id'
+            if query._limit is not None or query._offset:
+                sql += ' LIMIT ? OFFSET ?'
+                params.extend([query._limit if query._limit is not None else -1, query._offset])
+            if self.path != ':memory:':
+                return self._stream_rows(sql, params)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        docs = [(doc_id, json.loads(data)) for doc_id, data in rows]
+        if plain:
+            return docs
+        return query._copy(filters=python_filters)._apply(docs)
+
+    def _stream_rows(self, sql, params, chunk_size=1000):
+        """Yield rows lazily from a separate read connection (WAL lets it run beside writers)"""
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for doc_id, data in rows:
+                    yield doc_id, json.loads(data)
+        finally:
+            conn.close()
+
+def init_firestore(cred_path='serviceAccountKey.json'):
+    """Initialize firebase_admin from a service account file and return a Firestore client"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    return firestore.client()
+
+def open_store(url=None, firestore_factory=None):
+    """Open the backend named by url (or $PRODUCT_STORE), Firestore by default"""
+    url = url or os.getenv('PRODUCT_STORE') or DEFAULT_STORE
+    scheme, _, path = url.partition('://')
+    if path.startswith('/'):
+        # sqlite:///products.db is relative, sqlite:////data/products.db absolute
+        path = path[1:]
+    if scheme == 'firestore':
+        return (firestore_factory or init_firestore)()
+    if scheme == 'memory':
+        return MemoryStore()
+    if scheme == 'sqlite':
+        return SQLiteStore(path or 'products.db')
+    if scheme == 'jsonl':
+        return JSONLStore(path or 'products.jsonl')
+    raise ValueError(f"Unknown product store: {url}")
@@ -0,0 +1,227 @@
+"""Long-running refresh scheduler with per-ASIN priorities.
+
+Instead of re-scraping everything on a cron schedule, the daemon keeps a
+priority queue of ASINs keyed on when each is next due. It refreshes them
+one at a time through the normal detail-page path, paced to a daily
+request budget. An ASIN's refresh interval comes from how often its price
+has actually changed (a smoothed changes-per-hour estimate), shortened for
+deals and popular products. Volatile deals come round within minutes and
+stable items only every few days, while the total volume stays within the
+budget.
+
+Periodic sweeps of the listing sources (with the same request budget
+logic as a normal run) bring new ASINs into the queue. Their requests are
+charged to the same daily budget.
+
+    python refresh_daemon.py --daily-budget 900 --sweep-minutes 180 --max-hours 5.5
+"""
+import argparse
+import heapq
+import math
+import random
+import signal
+import time
+from datetime import datetime
+
+import requests
+
+from amazon_affiliate_scraper import (
+    create_affiliate_link,
+    fetch,
+    get_db,
+    get_fetcher,
+    get_memory_profiler,
+    get_selector_stats,
+    parse_detail_page,
+    requests_made,
+    save_to_firestore,
+    scrape_all_sources,
+)
+from product_fields import price_to_cents
+
+# What the cron runs the daemon replaced spent: ~100 requests a run, ~9 runs a day
+DAILY_BUDGET = 900
+MIN_INTERVAL = 10 * 60  # seconds
+MAX_INTERVAL = 7 * 24 * 3600
+# Prior for the change-rate estimate: one price change per day until observed otherwise
+PRIOR_CHANGES = 1.0
+PRIOR_HOURS = 24.0
+# The only fields the daemon keeps per queued ASIN; the rest of the document stays in the store
+SCHEDULE_FIELDS = ('price', 'source', 'discount_pct', 'review_count', 'refresh')
+
+def refresh_interval(refresh_state, is_deal=False, review_count=0):
+    """Seconds until an ASIN should be checked again.
+
+    The price change rate is estimated as (changes + prior) / (hours observed + prior),
+    and the product is re-checked about twice per expected change. Deals are checked
+    twice as often, and popular products up to twice as often again.
+    """
+    changes = refresh_state.get('changes', 0)
+    hours = refresh_state.get('observed_hours', 0.0)
+    rate_per_hour = (changes + PRIOR_CHANGES) / (hours + PRIOR_HOURS)
+    interval = 3600 / rate_per_hour / 2
+    if is_deal:
+        interval /= 2
+    try:
+        reviews = int(review_count or 0)
+    except (TypeError, ValueError):
+        reviews = 0
+    interval /= 1 + min(math.log10(1 + reviews) / 5, 1)
+    return max(MIN_INTERVAL, min(MAX_INTERVAL, interval))
+
+def is_deal(product):
+    return product.get('source') == 'amazon_deals' or bool(product.get('discount_pct'))
+
+class RefreshDaemon:
+    def __init__(self, daily_budget=DAILY_BUDGET, sweep_minutes=180, sweep_budget=40, max_hours=None):
+        self.daily_budget = daily_budget
+        self.pace = 86400.0 / daily_budget  # seconds of budget each request uses up
+        self.next_request_at = time.time()
+        self.requests = 0
+        self.sweep_interval = sweep_minutes * 60 if sweep_minutes else None
+        self.sweep_budget = sweep_budget
+        self.stop_at = time.time() + max_hours * 3600 if max_hours else None
+        self.queue = []  # (next_due epoch seconds, asin)
+        self.products = {}  # asin -> SCHEDULE_FIELDS of the last known product data
+        self.running = True
+        self.refreshed = 0
+        self.changed = 0
+
+    def charge(self, since):
+        """Charge the requests made since the `since` count against the budget"""
+        used = requests_made() - since
+        self.requests += used
+        # Idle time doesn't bank requests, so a burst can't overrun the daily budget
+        self.next_request_at = max(self.next_request_at, time.time()) + used * self.pace * random.uniform(0.8, 1.2)
+
+    def stop(self, *_):
+        print("\nStopping after the current refresh...")
+        self.running = False
+
+    def schedule(self, asin, product):
+        state = product.get('refresh') or {}
+        due = state.get('next_due_epoch')
+        if due is None:
+            # Never refreshed by the daemon: spread first checks over the first interval
+            due = time.time() + random.uniform(0, refresh_interval(state, is_deal(product),
+                                                                    product.get('review_count')))
+        self.products[asin] = {field: product[field] for field in SCHEDULE_FIELDS if field in product}
+        heapq.heappush(self.queue, (due, asin))
+
+    def load(self):
+        db = get_db()
+        if not db:
+            return
+        for doc in db.collection('products').stream():
+            if doc.id not in self.products:
+                self.schedule(doc.id, doc.to_dict() or {})
+        print(f"Loaded {len(self.queue)} products into the refresh queue")
+
+    def refresh(self, asin):
+        """Re-scrape one product's detail page and reschedule it"""
+        previous = self.products.get(asin, {})
+        state = dict(previous.get('refresh') or {})
+        now = time.time()
+
+        try:
+            product_data = parse_detail_page(fetch(create_affiliate_link(f"/dp/{asin}/")).text, asin)
+        except requests.RequestException as e:
+            print(f"Error refreshing {asin}: {str(e)}")
+            product_data = None
+        if product_data and not product_data.get('title'):
+            product_data = None  # blocked or unrecognised page
+
+        if product_data:
+            # Keep fields the detail page doesn't carry (source, category, first-seen time)
+            # and values it didn't show this time
+            product_data.pop('timestamp', None)
+            product_data = {key: value for key, value in product_data.items() if value is not None}
+            last_checked = state.get('last_checked_epoch')
+            if last_checked:
+                state['observed_hours'] = state.get('observed_hours', 0.0) + (now - last_checked) / 3600
+                if price_to_cents(product_data.get('price')) != price_to_cents(previous.get('price')):
+                    state['changes'] = state.get('changes', 0) + 1
+                    self.changed += 1
+            state['checks'] = state.get('checks', 0) + 1
+            state['last_checked_epoch'] = now
+            merged = dict(previous, **product_data)
+        else:
+            merged = dict(previous)
+
+        interval = refresh_interval(state, is_deal(merged), merged.get('review_count'))
+        if not product_data:
+            interval = max(interval, MIN_INTERVAL * 3)  # back off failing pages
+        state['interval_minutes'] = round(interval / 60, 1)
+        state['next_due_epoch'] = now + interval
+        state['next_due'] = datetime.utcfromtimestamp(now + interval).isoformat()
+        merged['refresh'] = state
+
+        save_to_firestore(dict(product_data or {}, asin=asin, refresh=state))
+        self.refreshed += 1
+        self.schedule(asin, merged)
+
+    def sweep(self):
+        """Scrape the listing sources once and queue any new ASINs"""
+        print("\n🔎 Sweeping listing sources for new products...")
+        since = requests_made()
+        with get_memory_profiler().stage('sweep'):
+            products = scrape_all_sources(request_budget=self.sweep_budget)
+        self.charge(since)
+        for product in products:
+            if product['asin'] not in self.products:
+                self.schedule(product['asin'], product)
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.load()
+        next_sweep = time.time() if self.sweep_interval else None
+        print(f"Refreshing within {self.daily_budget} requests a day (one every {self.pace:.0f}s on average)")
+
+        while self.running:
+            now = time.time()
+            if self.stop_at and now >= self.stop_at:
+                print("Reached --max-hours, stopping")
+                break
+            within_budget = now >= self.next_request_at
+            if within_budget and next_sweep is not None and now >= next_sweep:
+                self.sweep()
+                next_sweep = time.time() + self.sweep_interval
+                continue
+
+            if within_budget and self.queue and self.queue[0][0] <= now:
+                _, asin = heapq.heappop(self.queue)
+                since = requests_made()
+                with get_memory_profiler().stage('refresh', snapshot=False):
+                    self.refresh(asin)
+                self.charge(since)
+                if self.refreshed % 50 == 0:
+                    print(f"Refreshed {self.refreshed} products ({self.changed} price changes), "
+                          f"{len(self.queue)} queued, {self.requests} requests; {get_fetcher().report()}")
+                continue
+
+            due = [t for t in (self.queue[0][0] if self.queue else None, next_sweep) if t is not None]
+            next_work = max(min(due), self.next_request_at) if due else None
+            wake_at = min(t for t in (next_work, self.stop_at, now + 60) if t is not None)
+            time.sleep(max(wake_at - now, 0.1))
+
+        get_selector_stats().save()
+        print(f"Refreshed {self.refreshed} products, {self.changed} price changes, {self.requests} requests")
+        get_memory_profiler().print_report()
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously refresh products by price volatility")
+    parser.add_argument('--daily-budget', type=int, default=DAILY_BUDGET,
+                        help="requests per day, refreshes and sweeps together; sets the pace")
+    parser.add_argument('--sweep-minutes', type=float, default=180,
+                        help="minutes between listing sweeps for new products (0 disables)")
+    parser.add_argument('--sweep-budget', type=int, default=40, help="request budget per sweep")
+    parser.add_argument('--max-hours', type=float, default=None, help="exit after this many hours")
+    args = parser.parse_args()
+
+    get_selector_stats().attach(get_db())
+    RefreshDaemon(daily_budget=args.daily_budget, sweep_minutes=args.sweep_minutes,
+                  sweep_budget=args.sweep_budget, max_hours=args.max_hours).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Self-tuning selector order for the product and deal extractors.
+
+Amazon serves several page layouts, and each extractor field has a list of
+selectors to try, most precise first and generic fallbacks last. Each
+selector's hits are tracked per page layout, where the layout is a
+fingerprint built from cheap substring checks on the raw HTML. The list
+order is kept; a selector that has kept missing on a layout is only moved
+behind the others (and re-probed in place now and then), so a fallback never
+gets ahead of a more precise selector that still matches. The stats persist in the `selector_stats` collection of the product
+store. stale_report() lists selectors that used to match but have stopped,
+which is usually the first sign of a layout change.
+"""
+from datetime import datetime
+
+STATS_COLLECTION = 'selector_stats'
+
+# Substrings whose presence tells the page layouts apart; order matters for the fingerprint
+LAYOUT_MARKERS = [
+    'id="productTitle"',
+    'id="corePrice_feature_div"',
+    'id="corePriceDisplay_desktop_feature_div"',
+    'id="landingImage"',
+    'id="imgBlkFront"',
+    'id="acrCustomerReviewText"',
+    'data-testid="deal-card"',
+    'DealGridItem-module',
+    'tallCellView',
+    'data-component-type="deal"',
+    'p13n-sc-',
+]
+
+# Exponential decay applied to a selector's counts each time it is tried
+DECAY = 0.98
+# Consecutive misses after which a selector that used to match is reported as stale
+STALE_MISSES = 25
+# Consecutive misses after which a selector is tried after the others on that layout
+SKIP_MISSES = 10
+# A skipped selector is still tried in its own place once every this many pages
+PROBE_EVERY = 20
+
+def layout_fingerprint(html, kind='page'):
+    """Identify the page layout from which markers appear in the raw HTML"""
+    if not html:
+        return f"{kind}:unknown"
+    bits = ''.join('1' if marker in html else '0' for marker in LAYOUT_MARKERS)
+    return f"{kind}:{bits}"
+
+class SelectorStats:
+    """Per-layout, per-field selector hit rates"""
+
+    def __init__(self, db=None):
+        self.db = db
+        self.layouts = {}  # layout -> field -> selector -> counters
+        self._dirty = set()
+        self.load()
+
+    def attach(self, db):
+        """Persist to db from now on, starting from the stats saved there"""
+        self.db = db
+        self.load()
+
+    def load(self):
+        if not self.db:
+            return
+        try:
+            for doc in self.db.collection(STATS_COLLECTION).stream():
+                data = doc.to_dict() or {}
+                fields = {}
+                for field, entries in (data.get('fields') or {}).items():
+                    fields[field] = {entry['selector']: entry for entry in entries}
+                self.layouts[data.get('layout', doc.id)] = fields
+        except Exception as e:
+            print(f"Error loading selector stats: {str(e)}")
+
+    def save(self):
+        """Write back the layouts that changed since the last save"""
+        if not self.db or not self._dirty:
+            return
+        try:
+            batch = self.db.batch()
+            for layout in self._dirty:
+                fields = {field: list(selectors.values()) for field, selectors in self.layouts[layout].items()}
+                doc_id = layout.replace('/', '_')
+                batch.set(self.db.collection(STATS_COLLECTION).document(doc_id), {
+                    'layout': layout,
+                    'fields': fields,
+                    'last_updated': datetime.utcnow().isoformat()
+                })
+            batch.commit()
+            self._dirty.clear()
+        except Exception as e:
+            print(f"Error saving selector stats: {str(e)}")
+
+    def _entry(self, layout, field, selector):
+        selectors = self.layouts.setdefault(layout, {}).setdefault(field, {})
+        if selector not in selectors:
+            selectors[selector] = {
+                'selector': selector,
+                'hits': 0.0,
+                'tries': 0.0,
+                'total_hits': 0,
+                'misses_since_hit': 0,
+                'skips': 0,
+                'last_hit': None,
+            }
+        return selectors[selector]
+
+    def ordered(self, layout, field, selectors):
+        """Selectors in their given order, with those that keep missing on this layout moved last.
+
+        Hit rates don't reorder the list: a fallback only runs where the precise
+        selectors missed, so its rate says nothing about pages where they match.
+        """
+        known = self.layouts.get(layout, {}).get(field, {})
+        kept, skipped = [], []
+        for selector in selectors:
+            entry = known.get(selector)
+            if not entry or entry['misses_since_hit'] < SKIP_MISSES:
+                kept.append(selector)
+                continue
+            entry['skips'] = entry.get('skips', 0) + 1
+            if entry['skips'] >= PROBE_EVERY:
+                # Probe in place, so a selector that matches again gets its place back
+                entry['skips'] = 0
+                kept.append(selector)
+            else:
+                skipped.append(selector)
+        return kept + skipped
+
+    def record(self, layout, field, selector, hit):
+        entry = self._entry(layout, field, selector)
+        entry['hits'] = entry['hits'] * DECAY + (1 if hit else 0)
+        entry['tries'] = entry['tries'] * DECAY + 1
+        if hit:
+            entry['total_hits'] += 1
+            entry['misses_since_hit'] = 0
+            entry['last_hit'] = datetime.utcnow().isoformat()
+        else:
+            entry['misses_since_hit'] += 1
+        self._dirty.add(layout)
+
+    def select_one(self, soup, layout, field, selectors, accept=None):
+        """First element matched by the selectors, most likely selector first"""
+        for selector in self.ordered(layout, field, selectors):
+            element = soup.select_one(selector)
+            hit = element is not None and (accept is None or accept(element))
+            self.record(layout, field, selector, hit)
+            if hit:
+                return element
+        return None
+
+    def stale_report(self):
+        """Selectors that matched before but have missed STALE_MISSES times in a row"""
+        stale = []
+        for layout, fields in sorted(self.layouts.items()):
+            for field, selectors in sorted(fields.items()):
+                for entry in selectors.values():
+                    if entry['total_hits'] and entry['misses_since_hit'] >= STALE_MISSES:
+                        stale.append({
+                            'layout': layout,
+                            'field': field,
+                            'selector': entry['selector'],
+                            'misses_since_hit': entry['misses_since_hit'],
+                            'last_hit': entry['last_hit'],
+                        })
+        return stale
+
+    def print_report(self):
+        stale = self.stale_report()
+        if not stale:
+            return
+        print("\n⚠️  Selectors that stopped matching:")
+        for entry in stale:
+            print(f"  [{entry['layout']}] {entry['field']}: {entry['selector']} "
+                  f"({entry['misses_since_hit']} misses, last hit {entry['last_hit']})")
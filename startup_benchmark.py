@@ -0,0 +1,84 @@
+"""Startup benchmark for the scraper modules.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the import cost of the module plus its slowest dependencies. Exits
+non-zero if the median import time exceeds --max-ms or if a module that
+should be imported lazily (Firebase, BeautifulSoup) is loaded at startup.
+
+    python startup_benchmark.py
+    python startup_benchmark.py --module amazon_affiliate_scraper --runs 10 --max-ms 300
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules that must only be imported on first use
+LAZY_MODULES = ['firebase_admin', 'google.cloud', 'bs4']
+
+def measure_import(module, cwd):
+    """Import module in a fresh interpreter and return {imported module: (self_us, cumulative_us)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            timings[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return timings
+
+def run_benchmark(module, runs=5, top=10, max_ms=None, cwd=None):
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    totals = []
+    timings = {}
+    for _ in range(runs):
+        timings = measure_import(module, cwd)
+        totals.append(timings[module][1] / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"⏱️  import {module}: median {median_ms:.1f} ms "
+          f"(min {min(totals):.1f} ms, max {max(totals):.1f} ms, {runs} runs)")
+
+    print("\nSlowest imports (cumulative, last run):")
+    slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[1:top + 1]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    ok = True
+    eager = sorted(name for name in timings
+                   if any(name == lazy or name.startswith(lazy + '.') for lazy in LAZY_MODULES))
+    if eager:
+        print(f"\n❌ Imported at startup but should be lazy: {', '.join(eager)}")
+        ok = False
+    if max_ms is not None and median_ms > max_ms:
+        print(f"\n❌ Startup regression: {median_ms:.1f} ms > {max_ms:.1f} ms budget")
+        ok = False
+    if ok:
+        print("\n✅ Startup within budget")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure scraper module import time")
+    parser.add_argument('--module', default='amazon_affiliate_scraper', help="module to import")
+    parser.add_argument('--runs', type=int, default=5, help="number of fresh interpreters to time")
+    parser.add_argument('--top', type=int, default=10, help="how many slow imports to list")
+    parser.add_argument('--max-ms', type=float, default=None, help="fail if median import time exceeds this")
+    args = parser.parse_args()
+
+    ok = run_benchmark(args.module, runs=args.runs, top=args.top, max_ms=args.max_ms)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+from amazon_affiliate_scraper import discover_asins, parse_detail_page
+from product_fields import bare_count
+
+LISTING_PAGE = b"""<html><body>
+<div class="recently-viewed"><div data-asin="B0RECENTVW" class="a-carousel-card"></div></div>
+<div id="gridItemRoot"><div class="zg-grid-general-faceout">
+  <div data-asin="B0GRIDAAAA" class="p13n-sc-uncoverable-faceout"><a href="/dp/B0GRIDAAAA/">A</a></div>
+</div></div>
+<div id="gridItemRoot"><div class="zg-grid-general-faceout">
+  <div class="p13n-sc-uncoverable-faceout" id="B0GRIDBBBB" data-asin="B0GRIDBBBB"></div>
+</div></div>
+<div data-asin="B0SEARCHCC" data-component-type="s-search-result" data-index="3"></div>
+<footer><a href="/gp/product/B0FOOTERAD/">Sponsored</a></footer>
+</body></html>"""
+
+def test_discover_asins_only_reads_grid_cards():
+    assert discover_asins(LISTING_PAGE) == ['B0GRIDAAAA', 'B0GRIDBBBB', 'B0SEARCHCC']
+    assert discover_asins(LISTING_PAGE, limit=1) == ['B0GRIDAAAA']
+
+def test_discover_asins_finds_nothing_on_pages_without_grid_cards():
+    assert discover_asins(b'<div data-asin="B0RECENTVW"></div><a href="/dp/B0FOOTERAD/">ad</a>') == []
+
+def test_bare_count_rejects_prices_and_badges():
+    assert [bare_count(text) for text in ('1,234', '(1,234)', ' 87 ', '$12.99', '12.99', 'Best Seller', '')] == \
+        [1234, 1234, 87, None, None, None, None]
+
+def test_review_count_is_left_out_when_the_page_has_none():
+    html = '<span id="productTitle">Desk Lamp</span><span class="a-offscreen">$19.99</span>'
+    assert 'review_count' not in parse_detail_page(html, 'B000000001')
+    html += '<span id="acrCustomerReviewText">1,234 ratings</span>'
+    assert parse_detail_page(html, 'B000000001')['review_count'] == 1234
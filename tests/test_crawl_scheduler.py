@@ -0,0 +1,41 @@
+import pytest
+
+from crawl_scheduler import CrawlScheduler
+from product_store import MemoryStore
+
+NAMES = ['best', 'new', 'movers', 'wished', 'deals']
+
+def scheduler(request_budget, min_requests=1, yields=None):
+    scheduler = CrawlScheduler(sources={name: lambda max_requests: [] for name in NAMES},
+                               request_budget=request_budget, min_requests=min_requests, db=MemoryStore())
+    for name, found in (yields or {}).items():
+        scheduler.stats[name].update(requests=10.0, runs=1, **{'yield': float(found)})
+    return scheduler
+
+YIELDS = {'best': 9, 'new': 1, 'movers': 7, 'wished': 3, 'deals': 5}
+
+@pytest.mark.parametrize('budget', [0, 1, 3, 4, 5, 6, 17, 100])
+def test_allocation_never_exceeds_the_budget(budget):
+    allocation = scheduler(budget).allocate()
+    assert sum(allocation.values()) == budget
+    assert len(allocation) == min(budget, len(NAMES))
+    assert all(allowance >= 1 for allowance in allocation.values())
+
+def test_a_small_budget_goes_to_the_highest_scoring_sources():
+    allocation = scheduler(3, yields=YIELDS).allocate()
+    assert allocation == {'best': 1, 'movers': 1, 'deals': 1}
+
+def test_min_requests_limits_how_many_sources_run():
+    allocation = scheduler(5, min_requests=2, yields=YIELDS).allocate()
+    assert list(allocation) == ['best', 'movers']
+    assert sum(allocation.values()) == 5
+
+def test_spare_budget_follows_the_scores():
+    allocation = scheduler(100, yields=YIELDS).allocate()
+    assert set(allocation) == set(NAMES)
+    assert sum(allocation.values()) == 100
+    assert allocation['best'] > allocation['movers'] > allocation['deals'] > allocation['wished'] > allocation['new']
+
+def test_unseen_sources_are_tried_before_known_ones():
+    allocation = scheduler(2, yields={name: YIELDS[name] for name in ('best', 'movers', 'deals')}).allocate()
+    assert set(allocation) == {'new', 'wished'}
@@ -0,0 +1,68 @@
+import itertools
+import time
+
+import pytest
+
+from crawl_shards import FRONTIER_COLLECTION, FRONTIER_MAX_AGE, LEASE_COLLECTION, ShardLeases
+from product_store import MemoryStore
+
+def key_in(leases, shard):
+    return next(key for key in (f"cat-{i}" for i in itertools.count()) if leases.shard_for(key) == shard)
+
+def entry(leases, shard, name):
+    key = key_in(leases, shard)
+    return {'url': f"https://www.amazon.com/{key}/{name}", 'key': key, 'source': 'best', 'depth': 1, 'priority': 0}
+
+@pytest.fixture
+def db():
+    return MemoryStore()
+
+def worker(db, run='r1', name='a'):
+    leases = ShardLeases(db, shard_count=2, worker_id=name, run=run)
+    leases.heartbeat()
+    return leases
+
+def test_writes_for_a_shard_taken_over_are_dropped(db):
+    leases = worker(db)
+    assert leases.held_shards() == [0, 1]
+    lease = db.collection(LEASE_COLLECTION).document('r1-000')
+    lease.set(dict(lease.get().to_dict(), owner='b', token=leases.held[0] + 1))
+
+    products = [{'asin': 'A0', 'category': key_in(leases, 0)}, {'asin': 'A1', 'category': key_in(leases, 1)}]
+    assert [product['asin'] for product in leases.unwritten(products)] == ['A1']
+    assert leases.held_shards() == [1]
+
+def test_next_run_picks_up_leftovers_and_recrawls_finished_entries(db):
+    first = worker(db, run='r1')
+    done, leftover = entry(first, 0, 'done'), entry(first, 1, 'leftover')
+    first.publish([done, leftover])
+    first.mark_done([done])
+
+    second = worker(db, run='r2')
+    assert [item['url'] for item in second.pending()] == [leftover['url']]
+    second.publish([done, leftover])
+    assert done['url'] in {item['url'] for item in second.pending()}
+
+def test_pending_only_rereads_new_entries(db):
+    leases = worker(db)
+    leases.publish([entry(leases, 0, 'old')])
+    assert len(leases.pending()) == 1
+    old = db.collection(FRONTIER_COLLECTION).document(leases._frontier_ref(entry(leases, 0, 'old')['url']).id)
+    old.set({'updated_epoch': time.time() - 3600}, merge=True)
+    leases.publish([entry(leases, 1, 'new')])
+    assert [item['url'] for item in leases.pending()] == [entry(leases, 1, 'new')['url']]
+
+def test_cleanup_deletes_past_runs(db):
+    old = worker(db, run='r0', name='old')
+    finished, forgotten = entry(old, 0, 'finished'), entry(old, 1, 'forgotten')
+    old.publish([finished, forgotten])
+    old.mark_done([finished])
+    long_ago = time.time() - FRONTIER_MAX_AGE - 60
+    for collection in ('crawl_leases', 'crawl_workers', FRONTIER_COLLECTION):
+        for doc in db.collection(collection).stream():
+            doc.reference.set({'heartbeat_epoch': long_ago, 'updated_epoch': long_ago}, merge=True)
+
+    current = worker(db, run='r1')
+    assert current.cleanup() == 5  # two leases, one worker, two frontier entries
+    assert not db.collection(FRONTIER_COLLECTION).get()
+    assert [doc.id for doc in db.collection('crawl_workers').stream()] == ['a']
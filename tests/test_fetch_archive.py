@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from fetch_archive import ArchiveReader, ArchiveWriter, RecordingSession, ReplaySession
+from hedged_fetch import HedgedFetcher
+
+URL = 'https://www.amazon.com/dp/B000000001/'
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.reason = 'OK'
+        self.headers = {'Content-Type': 'text/html'}
+        self.content = body
+
+    def raise_for_status(self):
+        pass
+
+class SlowPrimarySession:
+    """Numbers its responses; odd (primary) requests are slow enough to be hedged"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self._lock:
+            self.count += 1
+            number = self.count
+        time.sleep(0.3 if number % 2 else 0.05)
+        return FakeResponse(f"capture {number}".encode())
+
+def hedging_fetcher(session):
+    return HedgedFetcher(lambda: session, lambda: {}, default_hedge_delay=0.1, min_hedge_delay=0.01)
+
+@pytest.fixture
+def archive(tmp_path):
+    """Two hedged fetches of one URL, recorded"""
+    path = str(tmp_path / 'run.warc.gz')
+    writer = ArchiveWriter(path)
+    fetcher = hedging_fetcher(RecordingSession(SlowPrimarySession(), writer))
+    for _ in range(2):
+        fetcher.fetch(URL)
+    time.sleep(0.4)  # let the losing primaries finish recording
+    writer.close()
+    assert fetcher.hedges_sent == 2
+    return path
+
+def test_replay_skips_hedge_captures(archive):
+    reader = ArchiveReader(archive)
+    assert reader.hedges == 2
+    assert [entry.get('hedge') for entry in reader.entries[URL]] == [None, None]
+
+def test_hedge_replays_the_capture_of_the_fetch_it_duplicates(archive):
+    reader = ArchiveReader(archive)
+    assert reader.next_entry(URL)['offset'] == reader.next_entry(URL, consume=False)['offset']
+    first = reader.next_entry(URL, consume=False)
+    second = reader.next_entry(URL)
+    assert second['offset'] != first['offset']
+    assert reader.next_entry(URL, consume=False) is second
+
+def test_timed_replay_round_trip_is_deterministic(archive):
+    bodies = []
+    for _ in range(2):
+        fetcher = hedging_fetcher(ReplaySession(ArchiveReader(archive), speed=1.0))
+        bodies.append([fetcher.fetch(URL).content for _ in range(2)])
+        assert fetcher.hedges_sent == 2
+    assert bodies[0] == bodies[1] == [b"capture 1", b"capture 3"]
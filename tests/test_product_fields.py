@@ -0,0 +1,13 @@
+from product_fields import query_fields, with_query_fields
+from product_store import MemoryStore
+
+def test_rank_is_kept_per_source():
+    ref = MemoryStore().collection('products').document('A1')
+    ref.set(with_query_fields({'title': 'Lamp', 'source': 'amazon_best_sellers', 'source_rank': 3}), merge=True)
+    ref.set(with_query_fields({'title': 'Lamp', 'source': 'amazon_deals', 'source_rank': 1}), merge=True)
+    assert ref.get().to_dict() == {'title': 'Lamp', 'source': 'amazon_deals',
+                                   'rank_amazon_best_sellers': 3, 'rank_amazon_deals': 1}
+
+def test_backfill_fields_key_an_old_rank_by_its_source():
+    assert query_fields({'source': 'amazon_best_sellers', 'source_rank': 7}) == {'rank_amazon_best_sellers': 7}
+    assert query_fields({'source_rank': 7}) == {}
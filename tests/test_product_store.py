@@ -0,0 +1,115 @@
+import pytest
+
+from product_store import MemoryStore, SQLiteStore
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def db(request, tmp_path):
+    store = MemoryStore() if request.param == 'memory' else SQLiteStore(str(tmp_path / 'products.db'))
+    yield store
+    store.close()
+
+def test_set_replaces_and_merge_keeps_other_fields(db):
+    ref = db.collection('products').document('A1')
+    ref.set({'title': 'Lamp', 'price_cents': 1299})
+    ref.set({'price_cents': 999}, merge=True)
+    assert ref.get().to_dict() == {'title': 'Lamp', 'price_cents': 999}
+    ref.set({'rating_x10': 45})
+    assert ref.get().to_dict() == {'rating_x10': 45}
+
+def test_update_merges_into_an_existing_document(db):
+    ref = db.collection('products').document('A1')
+    ref.set({'title': 'Lamp', 'price_cents': 1299})
+    ref.update({'price_cents': 999})
+    assert ref.get().to_dict() == {'title': 'Lamp', 'price_cents': 999}
+
+def test_update_of_a_missing_document_raises(db):
+    ref = db.collection('products').document('missing')
+    with pytest.raises(KeyError):
+        ref.update({'price_cents': 999})
+    assert not ref.get().exists
+
+def test_batch_update_of_a_missing_document_fails_the_whole_batch(db):
+    products = db.collection('products')
+    products.document('A1').set({'price_cents': 1299})
+    batch = db.batch()
+    batch.set(products.document('A2'), {'price_cents': 500})
+    batch.update(products.document('A1'), {'price_cents': 999})
+    batch.update(products.document('missing'), {'price_cents': 1})
+    with pytest.raises(KeyError):
+        batch.commit()
+    assert not products.document('A2').get().exists
+    assert products.document('A1').get().to_dict() == {'price_cents': 1299}
+    assert not products.document('missing').get().exists
+
+def test_batch_update_sees_a_set_earlier_in_the_batch(db):
+    products = db.collection('products')
+    batch = db.batch()
+    batch.set(products.document('A1'), {'title': 'Lamp'})
+    batch.update(products.document('A1'), {'price_cents': 999})
+    batch.commit()
+    assert products.document('A1').get().to_dict() == {'title': 'Lamp', 'price_cents': 999}
+
+def test_order_by_leaves_out_documents_without_the_field(db):
+    products = db.collection('products')
+    products.document('A1').set({'price_cents': 300})
+    products.document('A2').set({'price_cents': None})
+    products.document('A3').set({'title': 'no price'})
+    products.document('A4').set({'price_cents': 100})
+    ids = [doc.id for doc in products.order_by('price_cents').stream()]
+    assert ids == ['A2', 'A4', 'A1']
+
+def test_order_and_cursor_page_through_every_document_once(db):
+    products = db.collection('products')
+    batch = db.batch()
+    for i in range(25):
+        batch.set(products.document(f"A{i:02d}"), {'price_cents': (i % 5) * 100, 'source': 'bestsellers'})
+    batch.commit()
+    query = products.where('source', '==', 'bestsellers').order_by('price_cents', direction='DESCENDING').limit(10)
+
+    seen = []
+    page = query.get()
+    while page:
+        seen.extend(page)
+        page = query.start_after(page[-1]).get()
+
+    assert len(seen) == 25
+    assert len({doc.id for doc in seen}) == 25
+    prices = [doc.get('price_cents') for doc in seen]
+    assert prices == sorted(prices, reverse=True)
+
+def test_partitions_cover_the_collection_without_overlap(db):
+    products = db.collection('products')
+    batch = db.batch()
+    for i in range(50):
+        batch.set(products.document(f"A{i:03d}"), {'rank': i})
+    batch.commit()
+
+    partitions = list(db.collection_group('products').get_partitions(4))
+    assert len(partitions) == 4
+    ids = [doc.id for partition in partitions for doc in partition.query().stream()]
+    assert sorted(ids) == [f"A{i:03d}" for i in range(50)]
+    assert len(ids) == len(set(ids))
+
+@pytest.fixture
+def mixed_counts(db):
+    """review_count stored as a string, a number, not at all and as a bigger number"""
+    products = db.collection('products')
+    products.document('A').set({'review_count': '1,234'})
+    products.document('B').set({'review_count': 50})
+    products.document('C').set({'title': 'no count'})
+    products.document('D').set({'review_count': 500})
+    return products
+
+@pytest.mark.parametrize('op, value, expected', [
+    ('>', 100, ['D']),
+    ('<', 100, ['B']),
+    ('>=', 50, ['B', 'D']),
+    ('==', 50, ['B']),
+    ('==', '1,234', ['A']),
+    ('>', 'a', []),
+    ('!=', 50, ['A', 'D']),
+    ('in', [50, '1,234'], ['A', 'B']),
+    ('not-in', [50], ['A', 'D']),
+])
+def test_filters_only_compare_values_of_the_same_kind(mixed_counts, op, value, expected):
+    assert sorted(doc.id for doc in mixed_counts.where('review_count', op, value).stream()) == expected
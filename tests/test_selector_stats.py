@@ -0,0 +1,43 @@
+import pytest
+
+import amazon_affiliate_scraper
+from selector_stats import PROBE_EVERY, SKIP_MISSES, SelectorStats
+
+pytest.importorskip('bs4')
+
+NORMAL_PAGE = """<html><body>
+<span id="productTitle">Desk Lamp</span>
+<span class="a-offscreen">$19.99</span>
+<span class="a-color-price">-23%</span>
+</body></html>"""
+
+UNAVAILABLE_PAGE = """<html><body>
+<span id="productTitle">Desk Lamp</span>
+<span class="a-color-price">Currently unavailable.</span>
+</body></html>"""
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = SelectorStats()
+    monkeypatch.setattr(amazon_affiliate_scraper, 'get_selector_stats', lambda: stats)
+    return stats
+
+def test_fallback_never_overtakes_a_selector_that_still_hits(stats):
+    pages = [UNAVAILABLE_PAGE if i % 5 == 4 else NORMAL_PAGE for i in range(30)]
+    prices = [amazon_affiliate_scraper.parse_detail_page(html, 'B000000001')['price'] for html in pages]
+    assert [price for html, price in zip(pages, prices) if html is NORMAL_PAGE] == ['$19.99'] * 24
+
+def test_selector_that_keeps_missing_is_tried_last_and_probed(stats):
+    selectors = ['span.gone', 'span.a-offscreen', 'span.a-color-price']
+    for _ in range(SKIP_MISSES):
+        stats.record('detail:x', 'price', 'span.gone', False)
+    orders = [stats.ordered('detail:x', 'price', selectors) for _ in range(PROBE_EVERY)]
+    assert orders[0] == ['span.a-offscreen', 'span.a-color-price', 'span.gone']
+    assert orders[-1] == selectors
+
+def test_selector_gets_its_place_back_after_a_hit(stats):
+    selectors = ['span.gone', 'span.a-offscreen']
+    for _ in range(SKIP_MISSES):
+        stats.record('detail:x', 'price', 'span.gone', False)
+    stats.record('detail:x', 'price', 'span.gone', True)
+    assert stats.ordered('detail:x', 'price', selectors) == selectors